@@ -0,0 +1,141 @@
+"""
+Translates many BF programs at once, spread across processes.
+
+Every worker process keeps one writer for all of its programs, and the random seed for each
+program only depends on `--seed` and the program's name, so the output doesn't depend on
+which worker (or how many) translated it.
+A program's name is its path inside the directory given on the command line (or just its file name),
+which is also where its play goes in the output directory.
+A program that can't be translated (unmatched brackets, ...) is reported and skipped.
+
+Usage:
+    python batch.py input/ more_programs/hello.bf -o output/batch -O 2 -j 8
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from bf2spl import Play, filter_bf
+from difftest import find_programs
+
+_writer = None  # this worker's writer, see `_init_worker`
+
+
+def _init_worker(mode: str, cache_path: str = None):
+    global _writer
+    if mode == 'ai':
+        from writers.ai_writer import ChatGptWriter
+        from writers.ai_cache import ResponseCache
+        _writer = ChatGptWriter(response_cache=ResponseCache(cache_path) if cache_path else None)
+    else:
+        from writers.default_writer import RandomWriter
+        _writer = RandomWriter()
+
+
+def find_named_programs(paths: list) -> list:
+    """(path, name) of every BF file in `paths` (see `find_programs`), named relative to the path it was found in."""
+    programs = []
+    for root in paths:
+        for path in find_programs([root]):
+            name = os.path.relpath(path, root) if os.path.isdir(root) else os.path.basename(path)
+            programs.append((path, name.replace(os.sep, '/')))
+    return programs
+
+
+def output_path(name: str, out_dir: str) -> str:
+    """Where the play for the program called `name` goes: same name and directory structure, but with .spl."""
+    return os.path.join(out_dir, *(os.path.splitext(name)[0] + '.spl').split('/'))
+
+
+def check_outputs(programs: list, out_dir: str):
+    """Raises if two of `programs` (see `find_named_programs`) would be written to the same file."""
+    seen = {}
+    for path, name in programs:
+        out_path = os.path.normcase(os.path.abspath(output_path(name, out_dir)))
+        if out_path in seen:
+            raise Exception(f'{seen[out_path]} and {path} would both be written to {output_path(name, out_dir)}')
+        seen[out_path] = path
+
+
+def translate_file(path: str, name: str, out_path: str, opt_level: int = 0, seed: int = 0,
+                   lazy_stage: bool = False) -> dict:
+    """Translates one file with this worker's writer. Never raises, failures are in the result."""
+    result = {'path': path, 'output': out_path, 'ok': False, 'seconds': 0.0, 'spl_bytes': 0, 'error': None}
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as f:
+            bf = filter_bf(f.read())
+        random.seed(f'{seed}:{name}')
+        text = Play(bf, writer=_writer, opt_level=opt_level, lazy_stage=lazy_stage).render_spl()
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+        with open(out_path, 'w') as f:
+            f.write(text + '\n')
+        result['ok'] = True
+        result['spl_bytes'] = len(text)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def translate_all(programs: list, out_dir: str, opt_level: int = 0, seed: int = 0, jobs: int = None,
+                  mode: str = 'boring', cache_path: str = None, lazy_stage: bool = False):
+    """
+    Yields the result of every program (see `translate_file`), in the order of `programs`,
+    which are (path, name) pairs (see `find_named_programs`).
+    """
+    check_outputs(programs, out_dir)
+    paths = [path for path, _ in programs]
+    names = [name for _, name in programs]
+    jobs = jobs or os.cpu_count() or 1
+    # a few programs per task, so that small programs don't cost a round trip each
+    chunksize = max(1, min(16, len(programs) // (jobs * 4)))
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(mode, cache_path)) as executor:
+        yield from executor.map(translate_file, paths, names, [output_path(n, out_dir) for n in names],
+                                [opt_level] * len(paths), [seed] * len(paths), [lazy_stage] * len(paths),
+                                chunksize=chunksize)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Translate many BF programs into SPL in parallel.')
+    parser.add_argument('paths', nargs='+', help='BF files, or directories to search for .bf/.b files')
+    parser.add_argument('-o', '--out-dir', default='output', help='directory for the plays (default: output)')
+    parser.add_argument('--mode', default='boring', type=str.lower, choices=['boring', 'ai'],
+                        help='writer to use (default: boring)')
+    parser.add_argument('-O', dest='opt_level', type=int, default=0, choices=[0, 1, 2, 3, 4],
+                        help='optimization level (default: 0, see Play)')
+    parser.add_argument('--lazy-stage', action='store_true',
+                        help='only have characters enter and exit when they have to')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed, combined with each program name')
+    parser.add_argument('--cache', nargs='?', const=os.path.join('logs', 'ai-cache.sqlite'),
+                        help='keep AI responses in this SQLite file (default: logs/ai-cache.sqlite)')
+    parser.add_argument('--report', help='also write the per-file results to this JSON file')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report failures')
+    cmd_args = parser.parse_args()
+
+    start = time.perf_counter()
+    programs = find_named_programs(cmd_args.paths)
+    try:
+        check_outputs(programs, cmd_args.out_dir)
+    except Exception as e:
+        parser.error(str(e))
+    results = []
+    for r in translate_all(programs, cmd_args.out_dir, cmd_args.opt_level, cmd_args.seed,
+                           cmd_args.jobs, cmd_args.mode, cmd_args.cache, cmd_args.lazy_stage):
+        results.append(r)
+        if not r['ok']:
+            print(f"FAILED {r['path']}: {r['error']}")
+        elif not cmd_args.quiet:
+            print(f"OK     {r['path']} -> {r['output']} {r['seconds']:.3f}s {r['spl_bytes']} bytes")
+    failures = sum(1 for r in results if not r['ok'])
+    print(f'{len(results) - failures}/{len(results)} translated in {time.perf_counter() - start:.2f}s',
+          file=sys.stderr)
+    if cmd_args.report:
+        with open(cmd_args.report, 'w') as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failures else 0)
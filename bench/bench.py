@@ -0,0 +1,162 @@
+"""
+Benchmarks translation throughput and the cost of the generated plays.
+
+For every program (the synthetic ones in `generators.py` and the classics in `programs/`),
+optimization level and writer, this records:
+- translation time and peak memory (both taken with tracemalloc running, so times are inflated)
+- SPL size, overall and per BF instruction
+- number of acts and scenes
+- number of SPL statements executed to run the play (and whether it printed the right thing)
+
+Usage (from the repository root):
+    python -m bench.bench -O 0 1 2 --save baseline.json
+    python -m bench.bench -O 0 1 2 --compare baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+import bf
+import spl
+from bf2spl import Play, filter_bf
+from bench.generators import GENERATED
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(__file__), 'programs')
+DEFAULT_INPUT = b'The quick brown fox jumps over the lazy dog.'
+
+# metrics where a bigger number is a regression, and how much noise to allow by default
+METRICS = {
+    'translate_seconds': 0.5,
+    'peak_memory_bytes': 0.2,
+    'spl_bytes': 0.0,
+    'acts': 0.0,
+    'scenes': 0.0,
+    'spl_statements': 0.0,
+}
+
+
+def make_writer(name: str):
+    if name == 'ai':
+        from writers.ai_writer import ChatGptWriter
+        return ChatGptWriter()
+    from writers.default_writer import RandomWriter
+    return RandomWriter()
+
+
+def load_programs(names: list = None) -> dict:
+    """name -> (BF, input)"""
+    programs = dict(GENERATED)
+    for filename in sorted(os.listdir(PROGRAMS_DIR)):
+        with open(os.path.join(PROGRAMS_DIR, filename), 'r') as f:
+            programs[os.path.splitext(filename)[0]] = (f.read(), DEFAULT_INPUT)
+    if names:
+        programs = {n: programs[n] for n in names}
+    return programs
+
+
+def measure(name: str, program: str, stdin: bytes, opt_level: int, writer_name: str, seed: int = 0,
+            max_statements: int = 50_000_000, run: bool = True) -> dict:
+    program = filter_bf(program)
+    random.seed(seed)
+    writer = make_writer(writer_name)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    play = Play(program, writer=writer, opt_level=opt_level)
+    text = play.render_spl()
+    translate_seconds = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'program': name,
+        'opt_level': opt_level,
+        'writer': writer_name,
+        'bf_instructions': len(program),
+        'translate_seconds': translate_seconds,
+        'peak_memory_bytes': peak_memory,
+        'spl_bytes': len(text),
+        'spl_bytes_per_instruction': len(text) / max(len(program), 1),
+        'acts': sum(1 for ins in play.program if ins.act),
+        'scenes': sum(1 for ins in play.program if ins.scene),
+        'spl_statements': None,
+        'correct': None,
+    }
+    if run:
+        spl_program = spl.SPLProgram(text)
+        try:
+            output = spl_program.run(stdin, max_statements)
+            result['correct'] = output == bf.run(program, stdin)
+        except spl.SPLError:
+            result['correct'] = False
+        result['spl_statements'] = spl_program.steps
+    return result
+
+
+def compare(results: list, baseline: list, tolerance: float = None) -> list:
+    """Returns a description of every metric that got worse than the baseline by more than its tolerance."""
+    old = {(r['program'], r['opt_level'], r['writer']): r for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r['program'], r['opt_level'], r['writer'])
+        if key not in old:
+            continue
+        if old[key]['correct'] and not r['correct']:
+            regressions.append(f'{key}: no longer correct')
+        for metric, default_tolerance in METRICS.items():
+            before, after = old[key].get(metric), r.get(metric)
+            if before is None or after is None:
+                continue
+            allowed = default_tolerance if tolerance is None else tolerance
+            if after > before * (1 + allowed):
+                regressions.append(f'{key}: {metric} {before} -> {after}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark translation and the generated plays.')
+    parser.add_argument('programs', nargs='*', help='only run these programs (default: all)')
+    parser.add_argument('-O', dest='opt_levels', type=int, nargs='+', default=[0], help='optimization levels')
+    parser.add_argument('--writers', nargs='+', default=['boring'], choices=['boring', 'ai'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-run', action='store_true', help="don't execute the plays")
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to check the results against')
+    parser.add_argument('--tolerance', type=float, help='allowed relative increase for every metric')
+    cmd_args = parser.parse_args()
+
+    results = []
+    for name, (program, stdin) in load_programs(cmd_args.programs).items():
+        for writer_name in cmd_args.writers:
+            for opt_level in cmd_args.opt_levels:
+                r = measure(name, program, stdin, opt_level, writer_name, cmd_args.seed, run=not cmd_args.no_run)
+                results.append(r)
+                print(f"{name:20} -O{opt_level} {writer_name:6} {r['translate_seconds']:8.3f}s "
+                      f"{r['spl_bytes']:10} bytes {r['spl_bytes_per_instruction']:8.1f} b/inst "
+                      f"{r['scenes']:6} scenes {r['spl_statements'] or '-':>10} statements"
+                      + ('' if r['correct'] in (True, None) else '  WRONG'), file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if cmd_args.save:
+        with open(cmd_args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if cmd_args.compare:
+        with open(cmd_args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, cmd_args.tolerance)
+        for r in regressions:
+            print('REGRESSION', r, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,45 @@
+"""
+Synthetic BF programs that stress particular parts of the translation.
+Every generator returns BF that terminates and never moves left of the first cell.
+"""
+
+
+def deep_nesting(depth: int) -> str:
+    """`depth` loops inside each other, each running once."""
+    return '>+[' * depth + '-]<' * depth
+
+
+def long_runs(count: int, length: int = 40) -> str:
+    """`count` runs of `length` '+'/'-', printing after each."""
+    return ('+' * length + '.' + '-' * (length // 2) + '.>') * count
+
+
+def many_loops(count: int) -> str:
+    """`count` top-level loops, each printing once."""
+    return '+[.-]' * count
+
+
+def big_hello(text: str, copies: int = 1) -> str:
+    """Prints `text` `copies` times, building each byte with a multiply loop like most hand-written BF."""
+    bf = []
+    for _ in range(copies):
+        for c in text.encode():
+            tens, ones = divmod(c, 10)
+            bf.append('++++++++++[>' + '+' * tens + '<-]>' + '+' * ones + '.[-]<')
+    return ''.join(bf)
+
+
+def pointer_walks(count: int, width: int = 8) -> str:
+    """`count` times: fill `width` cells, scan back to the start of them and clear them on the way out again."""
+    return '>' + ('+>' * width + '<[<]>[[-]>]' + '>>+<-<' + '>+<[-]>[-<+>]<') * count
+
+
+# name -> (program, input)
+GENERATED = {
+    'deep_nesting_100': (deep_nesting(100), b''),
+    'deep_nesting_1000': (deep_nesting(1000), b''),
+    'long_runs_100': (long_runs(100), b''),
+    'many_loops_1000': (many_loops(1000), b''),
+    'big_hello_20': (big_hello('Hello, World!\n', 20), b''),
+    'pointer_walks_100': (pointer_walks(100), b''),
+}
@@ -0,0 +1,146 @@
+"""
+Load test for AI mode: how many plays a minute, and how many requests each, for different concurrency settings.
+
+Requests go to `bench/mock_llm.py`, started here with the given latency and error rates
+(or to `--base-url`, if there's already a server). Every combination of `--concurrency`
+(requests each writer can make at once), `--pool` (words per request, see `VocabularyPool`)
+and `--parallel` (plays translated at once, each with its own writer) translates `--plays` plays,
+and every play is run to check that it still prints what the BF does.
+Settings where no request was answered only measured the `RandomWriter`, so they fail the run,
+and settings with fallbacks are pointed out.
+
+Usage (from the repository root):
+    python -m bench.load_test hello --plays 8 --concurrency 1 4 8 --pool 0 20 --latency lognormal:0.2:0.5
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import bf
+import spl
+from bf2spl import Play, filter_bf
+from bench.bench import load_programs
+from bench.mock_llm import MockLLM, MockServer
+from writers import ai_writer
+from writers.ai_writer import ChatGptWriter
+
+
+def server_stats(base_url: str) -> dict:
+    """The mock's request counts, or {} if the server isn't a mock."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip('/').removesuffix('/v1') + '/stats') as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return {}
+
+
+def play_once(program: str, stdin: bytes, expected: bytes, opt_level: int, writer_args: dict) -> dict:
+    writer = ChatGptWriter(**writer_args)
+    start = time.perf_counter()
+    text = Play(program, writer=writer, opt_level=opt_level).render_spl()
+    seconds = time.perf_counter() - start
+    stats = writer.request_stats()
+    return {
+        'seconds': seconds,
+        'calls': stats['tokens']['calls'],
+        'fallbacks': sum(stats['fallbacks'].values()),
+        'correct': spl.run(text, stdin) == expected,
+    }
+
+
+def load_test(program: str, stdin: bytes, plays: int, parallel: int, opt_level: int, base_url: str,
+              writer_args: dict) -> dict:
+    expected = bf.run(program, stdin)
+    before = server_stats(base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(parallel) as executor:
+        results = list(executor.map(lambda _: play_once(program, stdin, expected, opt_level, writer_args),
+                                    range(plays)))
+    seconds = time.perf_counter() - start
+    after = server_stats(base_url)
+    latencies = sorted(r['seconds'] for r in results)
+    result = {
+        'plays': plays,
+        'seconds': seconds,
+        'plays_per_minute': plays * 60 / seconds,
+        'calls_per_play': statistics.mean(r['calls'] for r in results),
+        'fallbacks_per_play': statistics.mean(r['fallbacks'] for r in results),
+        'p50_play_seconds': latencies[len(latencies) // 2],
+        'p95_play_seconds': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        'incorrect': sum(1 for r in results if not r['correct']),
+    }
+    if after:
+        # includes retries and hedged duplicates
+        result['http_requests_per_play'] = (after['requests'] - before.get('requests', 0)) / plays
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure AI mode throughput against a mock chat completions server.')
+    parser.add_argument('program', nargs='?', default='hello', help='program from the benchmarks (default: hello)')
+    parser.add_argument('--plays', type=int, default=4, help='plays per setting (default: 4)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4], help='requests per writer at once')
+    parser.add_argument('--pool', type=int, nargs='+', default=[0], help='words per vocabulary request')
+    parser.add_argument('--parallel', type=int, nargs='+', default=[1], help='plays translated at once')
+    parser.add_argument('-O', dest='opt_level', type=int, default=2, help='optimization level (default: 2)')
+    parser.add_argument('--context-tokens', type=int, default=0, help='prompt context budget (see ChatGptWriter)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds per request (default: 30)')
+    parser.add_argument('--retries', type=int, default=2, help='retries per request (default: 2)')
+    parser.add_argument('--hedge-after', type=float, help='seconds before a duplicate request is sent')
+    parser.add_argument('--deadline', type=float, help='seconds of requests per play')
+    parser.add_argument('--base-url', help='use this server instead of starting a mock')
+    parser.add_argument('--latency', default='lognormal:0.1:0.5', help='mock latency (see bench/mock_llm.py)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of mock requests that fail')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of mock requests rate limited')
+    parser.add_argument('--seed', type=int, default=0, help='mock random seed')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    cmd_args = parser.parse_args()
+
+    base_url = cmd_args.base_url
+    if base_url is None:
+        mock = MockLLM(cmd_args.latency, cmd_args.error_rate, cmd_args.rate_limit_rate, retry_after=0.1,
+                       seed=cmd_args.seed)
+        base_url = MockServer(('127.0.0.1', 0), mock).start().base_url
+    ai_writer.set_base_url(base_url)
+    try:
+        ai_writer.get_client()
+    except Exception as e:
+        # every request would fall back to the RandomWriter, and there'd be nothing to measure
+        parser.error(f"can't make a client for {base_url}: {type(e).__name__}: {e}")
+    program, stdin = load_programs([cmd_args.program])[cmd_args.program]
+    program = filter_bf(program)
+
+    results = []
+    for parallel in cmd_args.parallel:
+        for concurrency in cmd_args.concurrency:
+            for pool in cmd_args.pool:
+                writer_args = {
+                    'max_concurrency': concurrency, 'pool_size': pool, 'context_tokens': cmd_args.context_tokens,
+                    'timeout': cmd_args.timeout, 'retries': cmd_args.retries, 'hedge_after': cmd_args.hedge_after,
+                    'deadline': cmd_args.deadline,
+                }
+                r = load_test(program, stdin, cmd_args.plays, parallel, cmd_args.opt_level, base_url, writer_args)
+                r.update(program=cmd_args.program, parallel=parallel, concurrency=concurrency, pool=pool)
+                results.append(r)
+                print(f"parallel {parallel:2} concurrency {concurrency:2} pool {pool:3} "
+                      f"{r['plays_per_minute']:8.1f} plays/min {r['calls_per_play']:7.1f} calls/play "
+                      f"{r.get('http_requests_per_play', float('nan')):7.1f} http/play "
+                      f"p50 {r['p50_play_seconds']:6.2f}s p95 {r['p95_play_seconds']:6.2f}s "
+                      f"fallbacks {r['fallbacks_per_play']:.1f} incorrect {r['incorrect']}")
+    if cmd_args.save:
+        with open(cmd_args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    unanswered = [r for r in results if r['calls_per_play'] == 0]
+    if unanswered:
+        print(f'Error: no requests were answered in {len(unanswered)} of {len(results)} settings, '
+              f'so they only measured the RandomWriter', file=sys.stderr)
+    fallbacks = [r for r in results if r['fallbacks_per_play'] > 0]
+    if fallbacks:
+        print(f'Warning: {len(fallbacks)} of {len(results)} settings fell back to the RandomWriter '
+              f'(errors, timeouts or the deadline), so some of their plays did less work than a real one',
+              file=sys.stderr)
+    sys.exit(1 if unanswered or any(r['incorrect'] for r in results) else 0)
@@ -0,0 +1,252 @@
+"""
+Local stand-in for the chat completions API, for benchmarking and testing AI mode without OpenAI.
+
+It answers `POST /v1/chat/completions` like the real API, filling every {} in the query with a word
+from the SPL word lists (adjectives, nouns, character names, ...) depending on what the query asks for.
+Latency comes from `--latency` (see `parse_latency`), and a fraction of requests fail
+with a server error (`--error-rate`) or a rate limit with Retry-After (`--rate-limit-rate`).
+`GET /stats` returns how many requests it has had of each kind.
+
+Usage (from the repository root):
+    python -m bench.mock_llm --port 8420 --latency lognormal:0.3:0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8420/v1 python bf2spl.py ai < input_bf.b
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import words
+from writers.ai_context import estimate_tokens
+
+DEFAULT_PORT = 8420
+CHARACTERS = ('Romeo', 'Juliet', 'Hamlet', 'Ophelia', 'Macbeth', 'Puck', 'Othello', 'Desdemona', 'Falstaff',
+              'Portia', 'Horatio', 'Miranda')
+PHRASES = ('your past deeds', 'the old days', 'thy mother\'s warnings', 'the storm at sea', 'our last supper')
+TOPIC = 'A comedy of errors in a lighthouse, where the keepers keep losing count of the ships'
+# where the query starts in an SPL prompt (see `writers.ai_writer.SPL_PROMPT`)
+QUERY_START = 'appropriately in the following line:\n'
+REQUIRED_RE = re.compile(r'There are (\d+) required')
+
+
+def parse_latency(spec: str):
+    """
+    A function of a `random.Random` that returns a latency in seconds, from one of:
+    '0.2' (always 0.2s), 'uniform:LOW:HIGH', 'normal:MEAN:STDDEV', 'lognormal:MEDIAN:SIGMA' or 'exp:MEAN'.
+    """
+    kind, *params = spec.split(':')
+    try:
+        if not params:
+            seconds = float(kind)
+            return lambda rng: seconds
+        params = [float(p) for p in params]
+        if kind == 'uniform':
+            low, high = params
+            return lambda rng: rng.uniform(low, high)
+        if kind == 'normal':
+            mean, stddev = params
+            return lambda rng: max(0.0, rng.gauss(mean, stddev))
+        if kind == 'lognormal':
+            median, sigma = params
+            return lambda rng: median * rng.lognormvariate(0, sigma)
+        if kind == 'exp':
+            mean, = params
+            return lambda rng: rng.expovariate(1 / mean)
+    except ValueError:
+        pass
+    raise Exception(f'Invalid latency {spec!r}')
+
+
+class MockLLM:
+    """Makes up the answers; `rng` decides everything, so a seeded mock answers the same way every run."""
+    def __init__(self, latency: str = '0', error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, seed: int = None):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+        index = words.load()
+        self.vocabulary = {
+            'positive_nouns': sorted(index.positive_nouns | index.neutral_nouns),
+            'negative_nouns': sorted(index.negative_nouns),
+            'positive_adjectives': sorted(index.positive_adjectives | index.neutral_adjectives),
+            'negative_adjectives': sorted(index.negative_adjectives | index.neutral_adjectives),
+            'adjectives': sorted(index.positive_adjectives | index.neutral_adjectives | index.negative_adjectives),
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def outcome(self) -> tuple:
+        """(seconds to wait, HTTP status) for the next request."""
+        with self.lock:
+            seconds = self.latency(self.rng)
+            roll = self.rng.random()
+        if roll < self.error_rate:
+            return seconds, 500
+        if roll < self.error_rate + self.rate_limit_rate:
+            return seconds, 429
+        return seconds, 200
+
+    def _words(self, query: str) -> list:
+        """What kind of words `query` wants."""
+        if 'Names of Shakespearean characters' in query:
+            return list(CHARACTERS)
+        if 'insulting nouns' in query:
+            return self.vocabulary['negative_nouns']
+        if 'nouns' in query:
+            return self.vocabulary['positive_nouns']
+        if 'insulting or neutral adjectives' in query:
+            return self.vocabulary['negative_adjectives']
+        if 'pleasant or neutral adjectives' in query:
+            return self.vocabulary['positive_adjectives']
+        if 'adjectives' in query or ' as {} as' in query:
+            return self.vocabulary['adjectives']
+        if 'Recall' in query:
+            return list(PHRASES)
+        if 'title of the play' in query:
+            return [f'The Tragedy of {name}' for name in CHARACTERS]
+        return [f'a {adjective} tale' for adjective in self.vocabulary['positive_adjectives'][:50]]
+
+    def answer(self, messages: list) -> str:
+        question = messages[-1]['content']
+        if 'What should the topic' in question:
+            return TOPIC
+        required = REQUIRED_RE.search(question)
+        if required is not None:
+            # asked again, answer the original question
+            original = [m['content'] for m in messages if m['role'] == 'user' and not REQUIRED_RE.search(m['content'])]
+            query = original[-1].split(QUERY_START)[-1] if original else question
+            count = int(required[1])
+        else:
+            query = question.split(QUERY_START)[-1]
+            count = max(1, query.count('{}'))
+        choices = self._words(query)
+        with self.lock:
+            answers = self.rng.sample(choices, count) if count <= len(choices) else \
+                [self.rng.choice(choices) for _ in range(count)]
+        return ' '.join('{' + a + '}' for a in answers)
+
+    def complete(self, request: dict) -> dict:
+        content = self.answer(request['messages'])
+        prompt_tokens = sum(estimate_tokens(m['content']) + 4 for m in request['messages'])
+        completion_tokens = estimate_tokens(content)
+        self._count('prompt_tokens', prompt_tokens)
+        self._count('completion_tokens', completion_tokens)
+        return {
+            'id': f'chatcmpl-mock-{time.monotonic_ns()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            return self._reply(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+        mock = self.server.mock
+        mock._count('requests')
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return self._reply(400, {'error': {'message': 'Invalid JSON', 'type': 'invalid_request_error'}})
+        seconds, status = mock.outcome()
+        time.sleep(seconds)
+        if status == 500:
+            mock._count('errors')
+            return self._reply(500, {'error': {'message': 'Mock server error', 'type': 'server_error'}})
+        if status == 429:
+            mock._count('rate_limited')
+            return self._reply(429, {'error': {'message': 'Mock rate limit', 'type': 'rate_limit_error'}},
+                               {'Retry-After': f'{mock.retry_after:g}'})
+        mock._count('ok')
+        self._reply(200, mock.complete(request))
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/stats':
+            return self._reply(404, {'error': {'message': 'Not found'}})
+        with self.server.mock.lock:
+            self._reply(200, dict(self.server.mock.stats))
+
+    def _reply(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, mock: MockLLM, verbose: bool = False):
+        super().__init__(address, MockHandler)
+        self.mock = mock
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self) -> 'MockServer':
+        """Serves from a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a mock of the chat completions API on localhost.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--latency', default='0',
+                        help="seconds per request: N, uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA "
+                             "or exp:MEAN (default: 0)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that get a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of requests that get a 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After for rate limits (default: 1)')
+    parser.add_argument('--seed', type=int, help='random seed, for the same answers and latencies every run')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every request')
+    cmd_args = parser.parse_args()
+
+    server = MockServer((cmd_args.host, cmd_args.port),
+                        MockLLM(cmd_args.latency, cmd_args.error_rate, cmd_args.rate_limit_rate, cmd_args.retry_after,
+                                cmd_args.seed),
+                        cmd_args.verbose)
+    print(f'Listening on {server.base_url}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
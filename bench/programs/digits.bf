@@ -0,0 +1,4 @@
+Prints the digits 0 to 9 and a newline
+++++++++[>++++++<-]   cell 1 = 48
+++++++++++[>.+<-]     print it ten times counting up
+++++++++++.
@@ -0,0 +1,133 @@
+"""
+Reference BF interpreter, following the README's spec:
+cells are unsigned bytes that wrap around, and reading past the end of input gives 0.
+
+The program is compiled once: runs of '+'/'-' and '<'/'>' become single operations,
+'[-]' becomes a clear, and every bracket knows where its match is.
+"""
+import sys
+import argparse
+
+OP_ADD = 0
+OP_MOVE = 1
+OP_JZ = 2  # '['
+OP_JNZ = 3  # ']'
+OP_OUT = 4
+OP_IN = 5
+OP_CLEAR = 6
+
+
+class BFError(Exception):
+    pass
+
+
+def compile_bf(bf: str) -> tuple:
+    """Returns parallel lists of opcodes and their arguments."""
+    ops = []
+    args = []
+    open_brackets = []
+    i = 0
+    n = len(bf)
+    while i < n:
+        c = bf[i]
+        if c in '+-':
+            delta = 0
+            while i < n and bf[i] in '+-':
+                delta += 1 if bf[i] == '+' else -1
+                i += 1
+            if delta % 256:
+                ops.append(OP_ADD)
+                args.append(delta % 256)
+            continue
+        if c in '<>':
+            offset = 0
+            while i < n and bf[i] in '<>':
+                offset += 1 if bf[i] == '>' else -1
+                i += 1
+            if offset:
+                ops.append(OP_MOVE)
+                args.append(offset)
+            continue
+        if c == '[' and bf[i:i + 3] in ('[-]', '[+]'):
+            ops.append(OP_CLEAR)
+            args.append(0)
+            i += 3
+            continue
+        if c == '[':
+            open_brackets.append(len(ops))
+            ops.append(OP_JZ)
+            args.append(-1)
+        elif c == ']':
+            if not open_brackets:
+                raise BFError(f"Unmatched ']' at index {i}")
+            start = open_brackets.pop()
+            args[start] = len(ops)
+            ops.append(OP_JNZ)
+            args.append(start)
+        elif c == '.':
+            ops.append(OP_OUT)
+            args.append(0)
+        elif c == ',':
+            ops.append(OP_IN)
+            args.append(0)
+        i += 1
+    if open_brackets:
+        raise BFError(f"Unmatched '[' at index {open_brackets[-1]}")
+    return ops, args
+
+
+def run(bf: str, stdin: bytes = b'', max_steps: int = None) -> bytes:
+    """
+    Runs `bf` and returns its output.
+    Raises `BFError` if it moves left of the first cell or runs longer than `max_steps` operations.
+    """
+    ops, args = compile_bf(bf)
+    tape = bytearray(256)
+    p = 0
+    pc = 0
+    n = len(ops)
+    input_pos = 0
+    output = bytearray()
+    steps = 0
+    limit = max_steps if max_steps is not None else float('inf')
+    while pc < n:
+        op = ops[pc]
+        if op == OP_ADD:
+            tape[p] = (tape[p] + args[pc]) & 255
+        elif op == OP_MOVE:
+            p += args[pc]
+            if p < 0:
+                raise BFError('Moved left of the first cell')
+            if p >= len(tape):
+                tape.extend(bytearray(p - len(tape) + 256))
+        elif op == OP_JZ:
+            if not tape[p]:
+                pc = args[pc]
+        elif op == OP_JNZ:
+            if tape[p]:
+                pc = args[pc]
+        elif op == OP_CLEAR:
+            tape[p] = 0
+        elif op == OP_OUT:
+            output.append(tape[p])
+        else:
+            if input_pos < len(stdin):
+                tape[p] = stdin[input_pos]
+                input_pos += 1
+            else:
+                tape[p] = 0
+        pc += 1
+        steps += 1
+        if steps > limit:
+            raise BFError(f'Gave up after {max_steps} steps')
+    return bytes(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a BF program with stdin as its input.')
+    parser.add_argument('program', help='BF file to run')
+    cmd_args = parser.parse_args()
+    with open(cmd_args.program, 'r') as f:
+        program = f.read()
+    sys.stdout.buffer.write(run(program, sys.stdin.buffer.read()))
+    sys.stdout.flush()
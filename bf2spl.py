@@ -2,6 +2,32 @@
 Author: Jacob Bowman
 CHANGELOG
 
+## 2.2.0
+- streaming renderer (`Play.iter_spl`, `Play.render_to`, `--stream`)
+- optimization levels (`-O`), starting with folding runs of '+'/'-'
+- writers share one noun phrase builder for any value; they only supply vocabulary
+- `-O2` turns clear/copy/multiply loops into straight-line SPL
+- `Play` renders from a compact intermediate representation (`ir.Program`)
+- built-in interpreter for the generated plays (`spl.py`)
+- reference BF interpreter (`bf.py`) and differential tester (`difftest.py`)
+- fixed '+' not wrapping 255 around to 0
+- AI writer can make requests concurrently (`--concurrency`)
+- persistent AI response cache with replay-only mode (`--cache`, `--replay`)
+- AI writer can request words in bulk (`--pool`)
+- SPL word lists (`wordlists/`, `words.py`); noun phrases and AI vocabulary are checked against them
+- parallel batch translation (`batch.py`)
+- `--lazy-stage` only writes the entrances and exits that are needed
+- incremental re-translation that reuses unchanged regions (`--incremental`)
+- profiling of phases, writer calls and AI requests (`--profile`, `--trace`)
+- `-O3` compact pointer moves, in-place changes to neighbouring cells and scan loops
+- `-O4` partial evaluation of everything before the first input
+- `-O2` drops dead loops and wrap-around checks that can't be needed
+- translation server with warm writers (`server.py`); the AI writer loads openai, its key and topic lazily
+- AI request timeouts, retries, hedging and a play deadline, falling back to the boring writer
+- token-budgeted AI prompt context (`--context-tokens`); token usage is reported per call and in total
+- mock chat completions server (`bench/mock_llm.py`), `--base-url`, and an AI mode load test (`bench/load_test.py`)
+- parallel rendering of large plays in boring mode (`--jobs`), the same for any number of jobs with `--seed`
+
 ## 2.1.1
 - moved to personal computer
 
@@ -12,21 +38,23 @@ CHANGELOG
 ## 2.0.0
 - copied from bf2spl_2.0.txt
 """
+import os
 import sys
+import json
 import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 from util import roman_numeral
-from writers.writer import SPL_Writer
+from writers.writer import SPL_Writer, noun_phrase_words
 
 # https://web.archive.org/web/20220721085340/http://shakespearelang.sourceforge.net/report/shakespeare/shakespeare.html
-I_LEFT = '<'
-I_RIGHT = '>'
-I_INC = '+'
-I_DEC = '-'
-I_JMP_BGN = '['
-I_JMP_END = ']'
-I_IN = ','
-I_OUT = '.'
+from ir import I_LEFT, I_RIGHT, I_INC, I_DEC, I_JMP_BGN, I_JMP_END, I_IN, I_OUT, OP_ADD, OP_MUL, OP_MOVE, OP_ADD_AT
+from ir import OP_SCAN
+from ir import OP_PRINT, OP_TAPE, Program, fold_runs, find_loop_idioms, track_offsets, partial_eval
+from ir import drop_dead_loops
+from incremental import RegionCache, to_template, from_template
+from profiler import Profiler
 
 VALID_BF_SYMBOLS = {
     I_LEFT,
@@ -39,32 +67,6 @@ VALID_BF_SYMBOLS = {
     I_OUT
 }
 
-def find_matching(instructions, index):
-    inst = instructions
-    if inst[index] == I_JMP_BGN:
-        depth = 1
-        for i in range(index + 1, len(inst)):
-            if inst[i] == I_JMP_END:
-                depth -= 1
-                if depth == 0:
-                    return i
-            elif inst[i] == I_JMP_BGN:
-                depth += 1
-        return -1
-    elif inst[index] == I_JMP_END:
-        depth = 1
-        for i in reversed(range(0, index)):
-            if inst[i] == I_JMP_END:
-                depth += 1
-            elif inst[i] == I_JMP_BGN:
-                depth -= 1
-                if depth == 0:
-                    return i
-        return -1
-    else:
-        raise Exception("Can't find a matching \"%s\"" % inst[index])
-
-
 def consume(f, f_out):
     def wrapper(*args, **kwargs):
         result = f(*args, **kwargs)
@@ -76,20 +78,79 @@ def consume(f, f_out):
 
 
 class SPL_Formatter:
-    def __init__(self, play):
+    """
+    With `lazy_stage`, `enter` and `exit` only say who should be on stage;
+    the entrances and exits are written just before the next line (see `sync`),
+    and only for the characters that actually have to come or go.
+    """
+    def __init__(self, play, lazy_stage: bool = False):
         self.play = play
+        self.lazy_stage = lazy_stage
+        self.on_stage = set()  # character ids, as of the SPL written so far
+        self.wanted = set()  # character ids the next line needs on stage
+
+    def reset(self):
+        """Empties the stage, for a new play."""
+        self.on_stage = set()
+        self.wanted = set()
+
+    def state(self) -> list:
+        return [sorted(self.on_stage), sorted(self.wanted)]
+
+    def restore(self, state: list):
+        """Picks up from a `state`, as if the SPL that led to it had just been written."""
+        self.on_stage, self.wanted = set(state[0]), set(state[1])
 
     def enter(self, *character_ids) -> str:
+        if self.lazy_stage:
+            self.wanted.update(character_ids)
+            return ''
+        return self._enter(character_ids)
+
+    def exit(self, *character_ids) -> str:
+        if self.lazy_stage:
+            if character_ids:
+                self.wanted.difference_update(character_ids)
+            else:
+                self.wanted.clear()
+            return ''
+        return self._exit(character_ids)
+
+    def _enter(self, character_ids) -> str:
         names = ' and '.join(list(map(self.play.get_name, character_ids)))
         return "[Enter " + names + "]\n"
 
-    def exit(self, *character_ids) -> str:
+    def _exit(self, character_ids) -> str:
         if len(character_ids) == 0:
             return "[Exeunt]\n"
         verb = "Exit" if len(character_ids) == 1 else "Exeunt"
         names = ' and '.join(list(map(self.play.get_name, character_ids)))
         return "[" + verb + " " + names + "]\n"
 
+    def sync(self) -> str:
+        """The entrances and exits that put exactly the wanted characters on stage."""
+        if not self.lazy_stage or self.on_stage == self.wanted:
+            return ''
+        output = ''
+        leaving = sorted(self.on_stage - self.wanted)
+        coming = sorted(self.wanted - self.on_stage)
+        if leaving:
+            output += self._exit(leaving if self.wanted else ())
+        if coming:
+            output += self._enter(coming)
+        self.on_stage = set(self.wanted)
+        return output
+
+    def jump_target(self) -> str:
+        """
+        Every scene can be jumped to, so the stage has to be the same however it's reached:
+        gotos are spoken by the cursor alone, so that's who's on stage at the start of every scene.
+        """
+        if not self.lazy_stage:
+            return ''
+        self.wanted = {CURSOR_ID}
+        return self.sync()
+
     def line(self, character_id: int, message: str, *messages) -> str:
         return self.play.get_name(character_id) + ': ' + message + ''.join(messages) + '\n'
 
@@ -109,61 +170,81 @@ CHARACTER_CONTROL_ID = 4
 
 
 class Play:
-    def __init__(self, instructions: str, writer: SPL_Writer):
+    """
+    `opt_level`:
+      0 - one block of SPL per BF instruction
+      1 - runs of '+'/'-' are folded into a single statement
+      2 - clear loops ('[-]') and copy/multiply loops ('[->+>++<<]') become straight-line SPL,
+          loops that can never run are dropped, and so are wrap-around checks that can never be needed
+      3 - runs of '<'/'>' become one compact shuffle, and cells next to the pointer are changed in place;
+          scan loops ('[>]') go straight back to their '[' without testing at the ']'
+      4 - the program is run up to its first input (or `eval_steps` instructions), and that part of it
+          becomes its output and the tape it left behind
+    `lazy_stage`: characters stay on stage until they're in the way (see `SPL_Formatter`)
+    `region_cache`: an `incremental.RegionCache` to reuse unchanged regions from, and save new ones to
+    `profiler`: a `profiler.Profiler` to time each phase of the translation with
+    """
+    def __init__(self, instructions: str, writer: SPL_Writer, opt_level: int = 0, lazy_stage: bool = False,
+                 region_cache=None, profiler: Profiler = None, eval_steps: int = 1_000_000):
         self.instructions = instructions
+        self.opt_level = opt_level
+        self.eval_steps = eval_steps
+        self.region_cache = region_cache
+        self.profiler = profiler or Profiler(enabled=False)
 
         self.writer = writer
-        self.spl_formatter = SPL_Formatter(self)
+        self.spl_formatter = SPL_Formatter(self, lazy_stage)
         self.characters = {}  # character_id(int) -> name(str)
-        # note: the first scene of an act has the same index as the act
-        self.acts = {}  # index: act #
-        self.scenes = {}  # index: scene #
-
-        self.jumps = {}  # from index: to index
-        # optimizations
-        self.ignore = set()  # instructions to ignore
 
         # setup
-        self._establish_jumps()
-
-    def _establish_jumps(self):
-        # first pass: set up all regular jumps
-        start_bracket_idx = []
-        bracket_depth = {}  # index -> depth ... highest level is 0
-        for i in range(len(self.instructions)):
-            inst = self.instructions[i]
-            if inst == I_JMP_BGN:
-                bracket_depth[i] = len(start_bracket_idx)
-                start_bracket_idx.append(i)
-            elif inst == I_JMP_END:
-                if len(start_bracket_idx) == 0:
-                    raise Exception("Unmatched ']' at index " + i)
-                og_idx = start_bracket_idx.pop()
-                self.jumps[i] = og_idx
-                self.jumps[og_idx] = i
-                bracket_depth[i] = len(start_bracket_idx)
-
-        if len(start_bracket_idx) > 0:
-            raise Exception("Unmatched '['!")
-
-        # finally establish acts and scenes
-        dests = sorted(self.jumps.values())
-        act = 2  # introductions happen in Act I
-        scene = 2
-        for d in dests:
-            if bracket_depth[d] == 0:
-                self.acts[d] = act
-                self.scenes[d] = 1
-                act += 1
-                scene = 2
-            else:
-                self.scenes[d] = scene
-                scene += 1
+        with self.profiler.phase('parse'):
+            self.program = Program.parse(instructions)
+        if opt_level >= 1:
+            with self.profiler.phase('fold_runs'):
+                self.program = fold_runs(self.program)
+        if opt_level >= 2:
+            with self.profiler.phase('find_loop_idioms'):
+                self.program = find_loop_idioms(self.program)
+        if opt_level >= 3:
+            with self.profiler.phase('track_offsets'):
+                self.program = track_offsets(self.program)
+        if opt_level >= 4:
+            with self.profiler.phase('partial_eval'):
+                self.program = partial_eval(self.program, eval_steps)
+        # last, so that it knows what the passes before it worked out
+        if opt_level >= 2:
+            with self.profiler.phase('drop_dead_loops'):
+                self.program = drop_dead_loops(self.program)
+        with self.profiler.phase('number_acts'):
+            self.program.number_acts()
+
+    def acts(self) -> dict:
+        """act # -> list of its scene #s, not including Act I (the introductions)"""
+        acts = {}
+        act = None
+        for ins in self.program:
+            if ins.act:
+                act = ins.act
+                acts[act] = []
+            if ins.scene:
+                acts[act].append(ins.scene)
+        return acts
+
+    def regions(self) -> list:
+        """
+        (start, end) instruction indexes of the play's regions: everything before the first act,
+        then each act. Nothing jumps into a region from outside of it, except to its act.
+        """
+        starts = [i for i, ins in enumerate(self.program) if ins.act]
+        if len(self.program) and (not starts or starts[0] != 0):
+            starts.insert(0, 0)
+        return list(zip(starts, starts[1:] + [len(self.program)]))
 
-    def _reassign_jump_dest(self, og_idx: int, new_idx: int):
-        for k in self.jumps:
-            if self.jumps[k] == og_idx:
-                self.jumps[k] = new_idx
+    def region_bf(self, start: int, end: int) -> str:
+        """The BF that a region was made from."""
+        src_start = 0 if start == 0 else self.program[start].source
+        src_end = self.program[end].source if end < len(self.program) else len(self.instructions)
+        return self.instructions[src_start:src_end]
 
     def get_name(self, id: int):
         if id not in self.characters:
@@ -171,10 +252,23 @@ class Play:
         return self.characters[id]
 
     def dramatis_personae(self):
-        output = ""
+        output = []
         for ch in [ZERO_ID, CURSOR_ID, LEFT_STACK_ID, RIGHT_STACK_ID, CHARACTER_CONTROL_ID]:
-            output += self.get_name(ch) + ', ' + self.writer.character_description(ch) + '\n'
-        return output
+            output.append(self.get_name(ch) + ', ' + self.writer.character_description(ch) + '\n')
+        return ''.join(output)
+
+    def _script(self):
+        """
+        Returns a list to collect SPL into,
+        along with `enter`, `exit` and `line` helpers that write to it.
+        """
+        output = []
+        feed = output.append
+        spl = self.spl_formatter
+        enter = consume(spl.enter, feed)
+        exit = consume(spl.exit, lambda s: feed(s + '\n') if s else None)
+        line = consume(spl.line, lambda s: feed(spl.sync() + '\t' + s))
+        return output, enter, exit, line
 
     def character_introduction(self):
         """
@@ -183,16 +277,9 @@ class Play:
         -1 is not a possible value in BF; it wraps to 255 instead.
         So, this should be a complete impl.
         """
-        output = ''
-
-        def feed(s):
-            nonlocal output
-            output += s
-
+        output, enter, exit, line = self._script()
+        feed = output.append
         spl = self.spl_formatter
-        enter = consume(spl.enter, feed)
-        exit = consume(spl.exit, lambda s: feed(s + '\n'))
-        line = consume(spl.line, lambda s: feed('\t' + s))
         w = self.writer
 
         feed(spl.act(1))
@@ -202,43 +289,277 @@ class Play:
         line(RIGHT_STACK_ID, f'Thou art {w.noun_phrase(-1)}. Remember yourself!')
         exit()
 
-        return output
+        return ''.join(output)
 
-    def statement(self, index: int) -> str:
+    def _shift_right(self) -> str:
+        """'>': the cursor goes onto the left stack, and the top of the right stack becomes the cursor."""
+        output, enter, exit, line = self._script()
+        w = self.writer
+        # enter left stack and cursor
+        enter(LEFT_STACK_ID, CURSOR_ID)
+        # [cursor]: Remember me.
+        line(CURSOR_ID, "Remember me.")
+        # exit left stack
+        exit(LEFT_STACK_ID)
+        # enter right stack
+        enter(RIGHT_STACK_ID)
+        # pop right stack
+        line(CURSOR_ID, f"Recall {w.recall_fluff()}")
+        # exit cursor
+        exit(CURSOR_ID)
+        enter(ZERO_ID)
+        line(RIGHT_STACK_ID, "Am I worse than you?")
+        line(ZERO_ID, "If so, remember yourself.")
+        line(RIGHT_STACK_ID, "Am I worse than you?")
+        line(ZERO_ID, f"If so, you are as {w.simile_adj(1)} as I.")
+        exit(ZERO_ID)
+        # cursor = right stack
+        enter(CURSOR_ID)
+        line(RIGHT_STACK_ID, f"You are as {w.simile_adj(1)} as I.")
+        # exeunt
+        exit()
+
+        return ''.join(output)
+
+    def _shift_left(self) -> str:
+        """'<': the cursor goes onto the right stack, and the top of the left stack becomes the cursor."""
+        output, enter, exit, line = self._script()
+        w = self.writer
+        # enter right stack and cursor
+        enter(RIGHT_STACK_ID, CURSOR_ID)
+        # [cursor]: Remember me.
+        line(CURSOR_ID, 'Remember me.')
+        # exit right stack
+        exit(RIGHT_STACK_ID)
+        # enter left stack
+        enter(LEFT_STACK_ID)
+        # [cursor]: Recall [fluff]
+        line(CURSOR_ID, f'Recall {w.recall_fluff()}')
+        # [left stack]: You are as [adj] as I.
+        line(LEFT_STACK_ID, f'You are as {w.simile_adj(1)} as I.')
+        # exeunt
+        exit()
+
+        return ''.join(output)
+
+    def _move_right(self, steps: int) -> str:
         """
-        Translates a single BF character into SPL.
+        `steps` '>'s at once: the left and right stack characters pass the cells between them directly,
+        and the cursor only gives up the first cell and takes the last.
         """
-        # optimizations (ignores)
-        if index in self.ignore:
-            return ''
+        output, enter, exit, line = self._script()
+        w = self.writer
+        enter(LEFT_STACK_ID, CURSOR_ID)
+        line(CURSOR_ID, 'Remember me.')
+        exit(CURSOR_ID)
+        enter(RIGHT_STACK_ID)
+        for step in range(steps):
+            line(LEFT_STACK_ID, f'Recall {w.recall_fluff()}')
+            # past the end of the tape: put the -1 back, this is a new cell
+            line(RIGHT_STACK_ID, f'Am I worse than {w.noun_phrase(0)}?')
+            line(LEFT_STACK_ID, 'If so, remember yourself.')
+            line(LEFT_STACK_ID, f'If so, you are {w.noun_phrase(0)}.')
+            if step < steps - 1:
+                line(RIGHT_STACK_ID, 'Remember me.')
+        exit(LEFT_STACK_ID)
+        enter(CURSOR_ID)
+        line(RIGHT_STACK_ID, f'You are as {w.simile_adj(1)} as I.')
+        exit()
 
-        output = ""
-        inst = self.instructions[index]
+        return ''.join(output)
 
-        # save myself some time
-        spl = self.spl_formatter
+    def _move_left(self, steps: int) -> str:
+        """`steps` '<'s at once, like `_move_right`."""
+        output, enter, exit, line = self._script()
+        w = self.writer
+        enter(RIGHT_STACK_ID, CURSOR_ID)
+        line(CURSOR_ID, 'Remember me.')
+        exit(CURSOR_ID)
+        enter(LEFT_STACK_ID)
+        for step in range(steps):
+            line(RIGHT_STACK_ID, f'Recall {w.recall_fluff()}')
+            if step < steps - 1:
+                line(LEFT_STACK_ID, 'Remember me.')
+        exit(RIGHT_STACK_ID)
+        enter(CURSOR_ID)
+        line(LEFT_STACK_ID, f'You are as {w.simile_adj(1)} as I.')
+        exit()
 
-        def feed(s):
-            nonlocal output
-            output += s
+        return ''.join(output)
 
-        enter = consume(spl.enter, feed)
-        exit = consume(spl.exit, lambda s: feed(s + '\n'))
-        line = consume(spl.line, lambda s: feed('\t' + s))
+    def _add_next_to(self, side: int, delta: int) -> str:
+        """
+        Adds `delta` to the cell on the `side` (-1 or 1) of the cursor, without moving it:
+        the stack character takes the cell off the top of its stack, changes it and puts it back.
+        """
+        output, enter, exit, line = self._script()
+        w = self.writer
+        stack = RIGHT_STACK_ID if side > 0 else LEFT_STACK_ID
+        enter(ZERO_ID, stack)
+        line(ZERO_ID, f'Recall {w.recall_fluff()}')
+        if side > 0:
+            # past the end of the tape, like `_move_right`
+            line(stack, f'Am I worse than {w.noun_phrase(0)}?')
+            line(ZERO_ID, 'If so, remember yourself.')
+            line(ZERO_ID, f'If so, you are {w.noun_phrase(0)}.')
+        # the cell is 0..255 and `delta` is more than -256, so this never goes negative
+        line(ZERO_ID, f'You are as {w.simile_adj(1 if delta > 0 else -1)} as the remainder of the quotient between '
+                      f'the sum of thyself and {w.noun_phrase(delta + 256)} and {w.noun_phrase(256)}.')
+        line(ZERO_ID, 'Remember yourself.')
+        exit()
+
+        return ''.join(output)
+
+    def _print(self, data: bytes) -> str:
+        """Output that's known ahead of time, from the control character's lips."""
+        output, enter, exit, line = self._script()
+        w = self.writer
+        enter(ZERO_ID, CHARACTER_CONTROL_ID)
+        previous = None
+        for b in data:
+            if previous is not None and noun_phrase_words(b - previous) + 5 < noun_phrase_words(b):
+                value = f'as {w.simile_adj(1)} as the sum of thyself and {w.noun_phrase(b - previous)}'
+            else:
+                value = w.noun_phrase(b)
+            line(ZERO_ID, f'You are {value}. Speak your mind!')
+            previous = b
+        exit()
+
+        return ''.join(output)
+
+    def _set_tape(self, cells: tuple, pointer: int) -> str:
+        """Starts the tape out with `cells`, at `pointer`. The cells left of it go on the left stack, and so on."""
+        output, enter, exit, line = self._script()
+        w = self.writer
+        if pointer > 0:
+            enter(ZERO_ID, LEFT_STACK_ID)
+            for c in cells[:pointer]:
+                line(ZERO_ID, f'Remember {w.noun_phrase(c)}.')
+            exit()
+        if len(cells) > pointer + 1:
+            enter(ZERO_ID, RIGHT_STACK_ID)
+            for c in reversed(cells[pointer + 1:]):
+                line(ZERO_ID, f'Remember {w.noun_phrase(c)}.')
+            exit()
+        enter(ZERO_ID, CURSOR_ID)
+        line(ZERO_ID, f'You are {w.noun_phrase(cells[pointer])}.')
+        exit()
+
+        return ''.join(output)
+
+    def _shift(self, offset: int) -> str:
+        if self.opt_level >= 3:
+            if offset > 0:
+                return self._move_right(offset)
+            return self._move_left(-offset) if offset else ''
+        if offset > 0:
+            return ''.join(self._shift_right() for _ in range(offset))
+        return ''.join(self._shift_left() for _ in range(-offset))
+
+    def _loop_idiom(self, index: int) -> str:
+        """
+        A loop found by `find_loop_idioms`, without the loop:
+        the control character holds on to the starting cell's value
+        while the cursor visits each cell it should be added to.
+        """
+        output, enter, exit, line = self._script()
+        feed = output.append
+        w = self.writer
+        multiples = self.program[index].data
+
+        if multiples:
+            enter(CURSOR_ID, CHARACTER_CONTROL_ID)
+            line(CURSOR_ID, f'You are as {w.simile_adj(1)} as I.')
+            exit()
+            offset = 0
+            for o in sorted(multiples):
+                feed(self._shift(o - offset))
+                offset = o
+                amount = 'me' if multiples[o] == 1 else f'the product of {w.noun_phrase(multiples[o])} and me'
+                enter(CHARACTER_CONTROL_ID, CURSOR_ID)
+                line(CHARACTER_CONTROL_ID, f'You are as {w.simile_adj(1)} as the sum of thyself and {amount}.')
+                line(CHARACTER_CONTROL_ID, f'You are as {w.simile_adj(1)} as the remainder of the quotient '
+                                           f'between thyself and {w.noun_phrase(256)}.')
+                exit()
+            feed(self._shift(-offset))
+
+        # the loop always leaves its cell at 0
+        enter(ZERO_ID, CURSOR_ID)
+        line(ZERO_ID, f'You are as {w.simile_adj(-1)} as I.')
+        exit()
+
+        return ''.join(output)
+
+    def statement(self, index: int) -> str:
+        """
+        Translates a single instruction of `self.program` into SPL.
+        """
+        ins = self.program[index]
+        inst = ins.op
+
+        # save myself some time
+        output, enter, exit, line = self._script()
+        feed = output.append
+        spl = self.spl_formatter
         w = self.writer
 
         # if this is the start of a scene or act, the header should
         # be prepended to the output appropriately.
-        new_act_scene = False
-        header = ''
-        if index in self.acts:
-            feed(spl.act(self.acts[index]))
-        if index in self.scenes:
-            feed(spl.scene(self.scenes[index]))
-            if index in self.jumps.values():
+        if ins.act or ins.scene:
+            feed(spl.jump_target())
+        if ins.act:
+            feed(spl.act(ins.act))
+        if ins.scene:
+            # every scene is a jump destination
+            feed(spl.scene(ins.scene))
+            if not spl.lazy_stage:
                 enter(CHARACTER_CONTROL_ID)
                 exit()
 
+        # clear, copy and multiply loops
+        if inst == OP_MUL:
+            feed(self._loop_idiom(index))
+
+        # everything that could be worked out ahead of time
+        if inst == OP_PRINT:
+            feed(self._print(ins.data))
+        if inst == OP_TAPE:
+            feed(self._set_tape(ins.data, ins.count))
+
+        # runs of '<' and '>'
+        if inst == OP_MOVE:
+            feed(self._shift(ins.count))
+
+        # the body of a scan loop: the '[' tests the new cell, so the ']' doesn't have to
+        if inst == OP_SCAN:
+            feed(self._shift(ins.count))
+            enter(CURSOR_ID)
+            dest = self.program[index - 1]
+            if dest.act:
+                line(CURSOR_ID, 'Let us return to Act ' + roman_numeral(dest.act) + '.')
+            elif dest.scene:
+                line(CURSOR_ID, 'Let us return to Scene ' + roman_numeral(dest.scene) + '.')
+            exit()
+
+        # change to a cell next to the cursor
+        if inst == OP_ADD_AT:
+            feed(self._add_next_to(ins.data, ins.count))
+
+        # folded run of '+' and '-'
+        if inst == OP_ADD:
+            delta = ins.count
+            sign = 1 if delta > 0 else -1
+            enter(ZERO_ID, CURSOR_ID)
+            line(ZERO_ID, f'You are as {w.simile_adj(sign)} as the sum of thyself and {w.noun_phrase(delta)}.')
+            # wrap around into 0..255, unless it's known not to
+            if not ins.data and delta > 0:
+                line(CURSOR_ID, f'Am I better than {w.noun_phrase(255)}?')
+                line(ZERO_ID, f'If so, you are as {w.simile_adj(-1)} as the difference between thyself and {w.noun_phrase(256)}.')
+            elif not ins.data:
+                line(CURSOR_ID, 'Am I worse than you?')
+                line(ZERO_ID, f'If so, you are as {w.simile_adj(1)} as the sum of thyself and {w.noun_phrase(256)}.')
+            exit()
+
         # assign new value ('+' and '-')
         if inst == I_INC or inst == I_DEC:
             # enter any stack character and the cursor
@@ -256,6 +577,11 @@ class Play:
                 noun_phrase = w.noun_phrase(255)
                 line(ZERO_ID, f'If so, you are {noun_phrase}.')
 
+            # check to see if 256 - wrap around to 0
+            if inst == I_INC:
+                line(CURSOR_ID, f'Am I better than {w.noun_phrase(255)}?')
+                line(ZERO_ID, f'If so, you are as {w.simile_adj(-1)} as I.')
+
             # exeunt
             exit()
 
@@ -284,46 +610,11 @@ class Play:
         # >
         # this one is longer because the stack has to auto-expand
         if inst == I_RIGHT:
-            # enter left stack and cursor
-            enter(LEFT_STACK_ID, CURSOR_ID)
-            # [cursor]: Remember me.
-            line(CURSOR_ID, "Remember me.")
-            # exit left stack
-            exit(LEFT_STACK_ID)
-            # enter right stack
-            enter(RIGHT_STACK_ID)
-            # pop right stack
-            line(CURSOR_ID, f"Recall {w.recall_fluff()}")
-            # exit cursor
-            exit(CURSOR_ID)
-            enter(ZERO_ID)
-            line(RIGHT_STACK_ID, "Am I worse than you?")
-            line(ZERO_ID, "If so, remember yourself.")
-            line(RIGHT_STACK_ID, "Am I worse than you?")
-            line(ZERO_ID, f"If so, you are as {w.simile_adj(1)} as I.")
-            exit(ZERO_ID)
-            # cursor = right stack
-            enter(CURSOR_ID)
-            line(RIGHT_STACK_ID, f"You are as {w.simile_adj(1)} as I.")
-            # exeunt
-            exit()
+            feed(self._shift_right())
 
         # <
         if inst == I_LEFT:
-            # enter right stack and cursor
-            enter(RIGHT_STACK_ID, CURSOR_ID)
-            # [cursor]: Remember me.
-            line(CURSOR_ID, 'Remember me.')
-            # exit right stack
-            exit(RIGHT_STACK_ID)
-            # enter left stack
-            enter(LEFT_STACK_ID)
-            # [cursor]: Recall [fluff]
-            line(CURSOR_ID, f'Recall {w.recall_fluff()}')
-            # [left stack]: You are as [adj] as I.
-            line(LEFT_STACK_ID, f'You are as {w.simile_adj(1)} as I.')
-            # exeunt
-            exit()
+            feed(self._shift_left())
 
         # goto ('[' and ']')
 
@@ -338,11 +629,11 @@ class Play:
             line(ZERO_ID, f'Am I as {w.simile_adj(1)} as you?')
             exit(ZERO_ID)
             #   [cursor]: If so, let us proceed to [appropriate act or scene]
-            dest = self.jumps[index]
-            if dest in self.acts:
-                line(CURSOR_ID, 'If so, let us proceed to Act ' + roman_numeral(self.acts[dest]) + '.')
-            elif dest in self.scenes:
-                line(CURSOR_ID, 'If so, let us proceed to Scene ' + roman_numeral(self.scenes[dest]) + '.')
+            dest = self.program[ins.target]
+            if dest.act:
+                line(CURSOR_ID, 'If so, let us proceed to Act ' + roman_numeral(dest.act) + '.')
+            elif dest.scene:
+                line(CURSOR_ID, 'If so, let us proceed to Scene ' + roman_numeral(dest.scene) + '.')
             #   exeunt
             exit()
         # if it's a ']':
@@ -353,45 +644,197 @@ class Play:
             line(ZERO_ID, f'Am I not as {w.simile_adj(1)} as you?')
             exit(ZERO_ID)
             #   [cursor]: If so, we shall return to [appropriate act or scene]
-            dest = self.jumps[index]
-            if dest in self.acts:
-                line(CURSOR_ID, 'If so, we shall return to Act ' + roman_numeral(self.acts[dest]) + '.')
-            elif dest in self.scenes:
-                line(CURSOR_ID, 'If so, we shall return to Scene ' + roman_numeral(self.scenes[dest]) + '.')
+            dest = self.program[ins.target]
+            if dest.act:
+                line(CURSOR_ID, 'If so, we shall return to Act ' + roman_numeral(dest.act) + '.')
+            elif dest.scene:
+                line(CURSOR_ID, 'If so, we shall return to Scene ' + roman_numeral(dest.scene) + '.')
             #   exeunt
             exit()
 
-        return output
-
-    def render_spl(self) -> str:
-        output = ''
+        return ''.join(output)
 
+    def iter_spl(self):
+        """
+        Generates the play one chunk (roughly one statement) at a time,
+        so that the full SPL text never has to be held in memory.
+        """
         self.writer._clear_buffer()
+        self.spl_formatter.reset()
 
-        def write(s: str):
-            nonlocal output
-            output += s
+        def write(s: str) -> str:
             self.writer._buf_append(s)
+            return s
+
+        spl = self.spl_formatter
+        cache = self.region_cache
+        regions = self.regions()
+        keys = [None] * len(regions)
+        cached = [None] * len(regions)
+        if cache is not None:
+            keys = [cache.key(self.region_bf(start, end), end < len(self.program)) for start, end in regions]
+            cached = [cache.get(key) for key in keys]
+        # the writer only has to get ready for the acts that will actually be written
+        stale = {self.program[start].act for (start, _), entry in zip(regions, cached) if entry is None}
+        acts = {act: scenes for act, scenes in self.acts().items() if act in stale}
 
         self.writer.current_act = 1
         self.writer.current_scene = 1
+        self.writer.prepare(acts)
 
-        write(self.writer.title() + '\n\n')
-        write(self.dramatis_personae() + '\n')
+        try:
+            if cache is not None and cache.header is not None:
+                self.characters = {int(id): name for id, name in cache.header['characters'].items()}
+                spl.restore(cache.header['stage'])
+                yield write(cache.header['text'])
+            else:
+                with self.profiler.phase('render header'):
+                    header = list(self._header())
+                for s in header:
+                    yield write(s)
+                if cache is not None:
+                    cache.header = {'text': ''.join(header), 'characters': self.characters, 'stage': spl.state()}
+
+            for (start, end), key, entry in zip(regions, keys, cached):
+                act = self.program[start].act
+                if entry is not None:
+                    spl.restore(entry['stage'])
+                    yield write(from_template(entry['template'], act))
+                    continue
+                if cache is None:
+                    for chunk in self._render_region(start, end):
+                        yield write(chunk)
+                    continue
+                # only kept until the region is cached, so that streaming without a cache stays streaming
+                chunks = []
+                for chunk in self._render_region(start, end):
+                    chunks.append(write(chunk))
+                    yield chunk
+                cache.put(key, to_template(''.join(chunks), act), spl.state())
+        finally:
+            self.writer.finish()
+
+    def _render_region(self, start: int, end: int):
+        """Generates one region (see `regions`), picking up from where the stage was left."""
+        for i in range(start, end):
+            ins = self.program[i]
+            if ins.act:
+                self.writer.current_act = ins.act
+            if ins.scene:
+                self.writer.current_scene = ins.scene
+            # timed apart from the yield, which runs whatever is consuming the play
+            with self.profiler.phase('render'):
+                s = self.statement(i)
+            yield s
+        # so that the next region always starts with the same characters on stage
+        if end < len(self.program):
+            with self.profiler.phase('render'):
+                s = self.spl_formatter.jump_target()
+            yield s
+
+    def iter_spl_parallel(self, jobs: int = None, seed: int = None):
+        """
+        Like `iter_spl`, but the regions are rendered by `jobs` processes (one per core by default),
+        each making its own copy of the play and rendering a run of regions at a time.
+        Only works with writers that are `parallel_safe`, and not with a `region_cache`.
+        The header and every region are seeded from `seed` (from `random` if not given) and their position,
+        so the play is the same however many jobs render it.
+        """
+        if not self.writer.parallel_safe:
+            raise Exception(f"{type(self.writer).__name__} can't write a play in parallel")
+        if self.region_cache is not None:
+            raise Exception("Incremental translation can't be done in parallel")
+        jobs = jobs or os.cpu_count() or 1
+        if seed is None:
+            seed = random.getrandbits(64)
+        spl = self.spl_formatter
+        self.writer._clear_buffer()
+        spl.reset()
+        self.writer.current_act = 1
+        self.writer.current_scene = 1
+        self.writer.prepare(self.acts())
+        try:
+            random.seed(f'{seed}:header')
+            with self.profiler.phase('render header'):
+                header = list(self._header())
+            yield from header
+            # where the stage is at the start of each run of regions
+            first_state = spl.state()
+            boundary = SPL_Formatter(self, spl.lazy_stage)
+            boundary.jump_target()
+            states = lambda runs: [first_state if first == 0 else boundary.state() for first, _ in runs]
+
+            runs = _split_regions(self.regions(), jobs * 4)
+            if jobs == 1:
+                # every statement is timed as 'render' (see `_render_region`)
+                for (first, regions), state in zip(runs, states(runs)):
+                    yield _render_regions(self, first, regions, state, seed)
+                return
+            settings = (self.instructions, self.opt_level, spl.lazy_stage, self.eval_steps, type(self.writer),
+                        self.characters)
+            with ProcessPoolExecutor(jobs, initializer=_init_render_worker, initargs=settings) as executor:
+                with self.profiler.phase('render in parallel'):
+                    chunks = executor.map(_render_in_worker, [first for first, _ in runs],
+                                          [regions for _, regions in runs], states(runs), [seed] * len(runs))
+                # only the waiting for each run is timed, not the consumer
+                for _ in runs:
+                    with self.profiler.phase('render in parallel'):
+                        chunk = next(chunks)
+                    yield chunk
+        finally:
+            self.writer.finish()
+
+    def _header(self):
+        """Title, dramatis personae and Act I."""
+        yield self.writer.title() + '\n\n'
+        yield self.dramatis_personae() + '\n'
+        yield self.character_introduction()
+
+    def render_to(self, fp):
+        """
+        Writes the play to the file-like object `fp` as it is generated.
+        """
+        for s in self.iter_spl():
+            fp.write(s)
+
+    def render_spl(self) -> str:
+        return ''.join(self.iter_spl())
 
-        write(self.character_introduction())
-        for i in range(len(self.instructions)):
-            if i in self.acts:
-                self.writer.current_act = self.acts[i]
-            if i in self.scenes:
-                self.writer.current_scene = self.scenes[i]
-            write(self.statement(i))
 
-        # print('jumps', self.jumps, file=sys.stderr)
-        # print('acts', self.acts, file=sys.stderr)
-        # print('scenes', self.scenes, file=sys.stderr)
+def _split_regions(regions: list, count: int) -> list:
+    """`regions` in about `count` runs of similar numbers of instructions, as (index of the first, regions)."""
+    size = max(1, (regions[-1][1] if regions else 0) // count)
+    runs = []
+    for k, (start, end) in enumerate(regions):
+        if not runs or runs[-1][1][-1][1] - runs[-1][1][0][0] >= size:
+            runs.append((k, []))
+        runs[-1][1].append((start, end))
+    return runs
 
-        return output
+
+def _render_regions(play: Play, first: int, regions: list, state: list, seed: int) -> str:
+    """Renders a run of regions, starting with the stage in `state`."""
+    play.spl_formatter.restore(state)
+    output = []
+    for k, (start, end) in enumerate(regions, first):
+        random.seed(f'{seed}:{k}')
+        output.extend(play._render_region(start, end))
+    return ''.join(output)
+
+
+_render_play = None  # this worker's copy of the play, see `Play.iter_spl_parallel`
+
+
+def _init_render_worker(instructions: str, opt_level: int, lazy_stage: bool, eval_steps: int, writer_class,
+                        characters: dict):
+    global _render_play
+    _render_play = Play(instructions, writer_class(), opt_level=opt_level, lazy_stage=lazy_stage,
+                        eval_steps=eval_steps)
+    _render_play.characters = dict(characters)
+
+
+def _render_in_worker(first: int, regions: list, state: list, seed: int) -> str:
+    return _render_regions(_render_play, first, regions, state, seed)
 
 
 def valid(bf_symbol) -> bool:
@@ -403,16 +846,121 @@ def filter_bf(bf: str) -> bool:
 
 
 if __name__ == '__main__':
-    cmd_args = sys.argv[1:]
-    if 'ai' in [arg.lower() for arg in cmd_args]:
-        from writers.ai_writer import ChatGptWriter, AIResponseLogger
+    parser = argparse.ArgumentParser(description='Translate BF (from stdin) into SPL.')
+    parser.add_argument('mode', nargs='?', default='boring', type=str.lower, choices=['boring', 'ai'],
+                        help='writer to use (default: boring)')
+    parser.add_argument('-O', dest='opt_level', type=int, default=0, choices=[0, 1, 2, 3, 4],
+                        help='optimization level (default: 0, see Play)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='number of requests the AI writer can make at once (default: 1)')
+    parser.add_argument('--pool', type=int, default=0,
+                        help='have the AI writer request this many words at a time instead of one per statement')
+    parser.add_argument('--cache', nargs='?', const=os.path.join('logs', 'ai-cache.sqlite'),
+                        help='keep AI responses in this SQLite file (default: logs/ai-cache.sqlite)')
+    parser.add_argument('--replay', action='store_true',
+                        help="only use cached AI responses, never the network (implies --cache); "
+                             "whatever isn't cached is written without the AI")
+    parser.add_argument('--base-url', metavar='URL',
+                        help='send AI requests to this server instead of OpenAI (like bench/mock_llm.py); '
+                             'defaults to $OPENAI_BASE_URL')
+    parser.add_argument('--context-tokens', type=int, default=0, metavar='N',
+                        help='show the AI a summary of the play of about N tokens instead of its last lines')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='seconds each AI request can take before it is tried again (default: 30)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='number of times a failed AI request is tried again, backing off in between (default: 2)')
+    parser.add_argument('--hedge-after', type=float, metavar='SECONDS',
+                        help='send a duplicate of any AI request that takes longer than this, using the first answer')
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help='stop making AI requests this long after starting the play; '
+                             'anything left is written by the boring writer')
+    parser.add_argument('--lazy-stage', action='store_true',
+                        help='only have characters enter and exit when they have to (smaller, faster plays)')
+    parser.add_argument('--incremental', metavar='PATH',
+                        help='reuse the unchanged parts of the play from this file, and save the new play to it')
+    parser.add_argument('--profile', metavar='PATH',
+                        help="write timings, writer calls, AI requests and tokens to this JSON file ('-' for stderr)")
+    parser.add_argument('--trace', metavar='PATH',
+                        help='write every timing to this file in the Chrome trace format (implies profiling)')
+    parser.add_argument('-j', '--jobs', type=int, metavar='N',
+                        help='render the play in N processes (0 for one per core); boring mode only')
+    parser.add_argument('--seed', type=int,
+                        help='random seed, for the same play every time (with --jobs, however many there are)')
+    parser.add_argument('--stream', action='store_true',
+                        help='write each statement as it is generated instead of building the whole play first')
+    cmd_args = parser.parse_args()
+    if cmd_args.jobs is not None and (cmd_args.mode == 'ai' or cmd_args.incremental):
+        parser.error('--jobs only works in boring mode, without --incremental')
+    if cmd_args.seed is not None:
+        random.seed(cmd_args.seed)
+    profiler = None
+    if cmd_args.profile or cmd_args.trace:
+        profiler = Profiler(trace=cmd_args.trace is not None)
+    if cmd_args.mode == 'ai':
+        from writers.ai_writer import ChatGptWriter, AIResponseLogger, set_base_url
+        from writers.ai_cache import ResponseCache
+        if cmd_args.base_url:
+            set_base_url(cmd_args.base_url)
         logger = AIResponseLogger('bf2spl-log.txt', dir='logs')
-        writer = ChatGptWriter(logger=logger)
+        response_cache = None
+        if cmd_args.cache or cmd_args.replay:
+            response_cache = ResponseCache(cmd_args.cache or os.path.join('logs', 'ai-cache.sqlite'),
+                                           replay_only=cmd_args.replay)
+        writer = ChatGptWriter(logger=logger, max_concurrency=cmd_args.concurrency, response_cache=response_cache,
+                               pool_size=cmd_args.pool, profiler=profiler, timeout=cmd_args.timeout,
+                               retries=cmd_args.retries, hedge_after=cmd_args.hedge_after, deadline=cmd_args.deadline,
+                               context_tokens=cmd_args.context_tokens)
     else:
         from writers.default_writer import RandomWriter
         writer = RandomWriter()
+    if profiler is not None and writer.profiler is None:
+        writer.instrument(profiler)
     bf = ''
-    for line in sys.stdin:
-        bf += filter_bf(line)
-    play = Play(bf, writer=writer)
-    print(play.render_spl())
\ No newline at end of file
+    with (profiler or Profiler(enabled=False)).phase('read input'):
+        for line in sys.stdin:
+            bf += filter_bf(line)
+    region_cache = None
+    if cmd_args.incremental:
+        region_cache = RegionCache(cmd_args.incremental, {'writer': cmd_args.mode, 'opt_level': cmd_args.opt_level,
+                                                          'lazy_stage': cmd_args.lazy_stage})
+    play = Play(bf, writer=writer, opt_level=cmd_args.opt_level, lazy_stage=cmd_args.lazy_stage,
+                region_cache=region_cache, profiler=profiler)
+    output_size = 0
+    chunks = play.iter_spl() if cmd_args.jobs is None else play.iter_spl_parallel(cmd_args.jobs or None)
+    if cmd_args.stream:
+        for s in chunks:
+            sys.stdout.write(s)
+            output_size += len(s)
+        sys.stdout.write('\n')
+    else:
+        text = ''.join(chunks)
+        output_size = len(text)
+        print(text)
+    if region_cache is not None:
+        region_cache.save()
+        print('Regions:', region_cache.stats(), file=sys.stderr)
+    if cmd_args.mode == 'ai' and writer.response_cache is not None:
+        print('AI response cache:', writer.response_cache.stats(), file=sys.stderr)
+        if cmd_args.replay and writer.response_cache.misses:
+            print(f'Warning: {writer.response_cache.misses} responses were not in the cache, '
+                  f'so parts of the play were written without the AI', file=sys.stderr)
+    if cmd_args.mode == 'ai':
+        print('AI requests:', writer.request_stats(), file=sys.stderr)
+    if profiler is not None:
+        caches = {}
+        if region_cache is not None:
+            caches['regions'] = region_cache.stats()
+        if cmd_args.mode == 'ai' and writer.response_cache is not None:
+            caches['ai_responses'] = writer.response_cache.stats()
+        extra = {}
+        if cmd_args.mode == 'ai':
+            extra['ai_requests'] = writer.request_stats()
+        report = profiler.report(bf_instructions=len(bf), output_chars=output_size, caches=caches, **extra)
+        if cmd_args.trace:
+            profiler.chrome_trace(cmd_args.trace)
+        if cmd_args.profile == '-':
+            json.dump(report, sys.stderr, indent=2)
+            print(file=sys.stderr)
+        elif cmd_args.profile:
+            with open(cmd_args.profile, 'w') as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,112 @@
+"""
+Differential tester: translates BF programs into SPL, runs both on the same input,
+and reports any program whose play doesn't say exactly what the BF prints.
+
+Usage:
+    python difftest.py input/ more_programs/hello.bf -O 0 1 2 --input 'some input'
+"""
+import os
+import sys
+import random
+import argparse
+
+import bf
+import spl
+from bf2spl import Play, filter_bf
+from writers.default_writer import RandomWriter
+
+BF_EXTENSIONS = ('.bf', '.b')
+
+# result statuses
+OK = 'ok'
+MISMATCH = 'mismatch'
+ERROR = 'error'  # the translation or the play failed
+SKIPPED = 'skipped'  # the BF itself doesn't run (bad brackets, too many steps, ...)
+
+
+class Result:
+    def __init__(self, name: str, opt_level: int, status: str, expected: bytes = None, actual: bytes = None,
+                 message: str = ''):
+        self.name = name
+        self.opt_level = opt_level
+        self.status = status
+        self.expected = expected
+        self.actual = actual
+        self.message = message
+
+    def __str__(self):
+        s = f'{self.status.upper():8} {self.name} -O{self.opt_level}'
+        if self.status == MISMATCH:
+            s += f'\n    expected: {self.expected!r}\n    actual:   {self.actual!r}'
+        elif self.message:
+            s += f': {self.message}'
+        return s
+
+
+def check(program: str, stdin: bytes = b'', opt_level: int = 0, name: str = '<bf>', seed: int = 0,
+          max_steps: int = 10_000_000, lazy_stage: bool = False) -> Result:
+    """
+    Runs one BF program and its translation at `opt_level` and compares what they print.
+    The play is run strictly (see `spl.SPLProgram`), so a word SPL doesn't know is an error too.
+    """
+    program = filter_bf(program)
+    try:
+        expected = bf.run(program, stdin, max_steps)
+    except Exception as e:
+        return Result(name, opt_level, SKIPPED, message=str(e))
+    random.seed(seed)
+    try:
+        text = Play(program, writer=RandomWriter(), opt_level=opt_level, lazy_stage=lazy_stage).render_spl()
+        # each BF step takes a few dozen statements
+        actual = spl.run(text, stdin, max_steps * 100, strict=True)
+    except Exception as e:
+        return Result(name, opt_level, ERROR, message=f'{type(e).__name__}: {e}')
+    status = OK if actual == expected else MISMATCH
+    return Result(name, opt_level, status, expected, actual)
+
+
+def find_programs(paths: list) -> list:
+    """Expands directories into the BF files inside them."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(BF_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that translated plays behave like their BF.')
+    parser.add_argument('paths', nargs='+', help='BF files, or directories to search for .bf/.b files')
+    parser.add_argument('-O', dest='opt_levels', type=int, nargs='+', default=[0], help='optimization levels to check')
+    parser.add_argument('--input', default='', help='text given to every program as its input')
+    parser.add_argument('--input-file', help='file given to every program as its input (overrides --input)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the writer')
+    parser.add_argument('--max-steps', type=int, default=10_000_000, help='BF steps before giving up on a program')
+    parser.add_argument('--lazy-stage', action='store_true', help='check plays written with lazy_stage')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report failures')
+    cmd_args = parser.parse_args()
+
+    if cmd_args.input_file:
+        with open(cmd_args.input_file, 'rb') as f:
+            stdin = f.read()
+    else:
+        stdin = cmd_args.input.encode()
+
+    failures = 0
+    total = 0
+    for path in find_programs(cmd_args.paths):
+        with open(path, 'r') as f:
+            program = f.read()
+        for opt_level in cmd_args.opt_levels:
+            result = check(program, stdin, opt_level, path, cmd_args.seed, cmd_args.max_steps,
+                           cmd_args.lazy_stage)
+            total += 1
+            if result.status in (MISMATCH, ERROR):
+                failures += 1
+            if not cmd_args.quiet or result.status in (MISMATCH, ERROR):
+                print(result)
+    print(f'{total - failures}/{total} passed', file=sys.stderr)
+    sys.exit(1 if failures else 0)
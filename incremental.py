@@ -0,0 +1,83 @@
+"""
+Cache of rendered plays, one entry per region (see `Play.regions`), for re-translating a program after small edits.
+
+A region's SPL only depends on its own BF, so after an edit only the regions that changed
+have to be written again. Act numbers are the only thing that moves when regions are added
+or removed, and a region only ever mentions its own act and the ones right before and after it,
+so they're stored relative to the region's act and filled back in when the region is reused.
+The title, cast and introductions are cached too, so that reused regions keep the same names.
+"""
+import os
+import re
+import json
+import hashlib
+
+from util import roman_numeral, from_roman_numeral
+
+# act headers and gotos to acts, the only places act numbers are written
+ACT_NUMBER_RE = re.compile(r'(\nAct |to Act )([IVXLCDM]+)([:.])')
+ACT_PLACEHOLDER_RE = re.compile(r'<act([+-]\d+)>')
+
+
+def to_template(text: str, act: int) -> str:
+    """Replaces the act numbers in `text` with placeholders relative to `act`."""
+    return ACT_NUMBER_RE.sub(lambda m: f'{m[1]}<act{from_roman_numeral(m[2]) - act:+d}>{m[3]}', text)
+
+
+def from_template(template: str, act: int) -> str:
+    return ACT_PLACEHOLDER_RE.sub(lambda m: roman_numeral(act + int(m[1])), template)
+
+
+class RegionCache:
+    """
+    Regions of previously rendered plays, in a JSON file.
+    `settings` (writer, optimization level, ...) must match for anything to be reused.
+    Saving only keeps what the latest play used.
+    """
+    def __init__(self, path: str, settings: dict):
+        self.path = path
+        self.settings = settings
+        self.header = None  # {'text', 'characters', 'stage'}
+        self.regions = {}  # key -> {'template', 'stage'}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('settings') == settings:
+            self.header = data['header']
+            self.regions = data['regions']
+
+    @staticmethod
+    def key(bf: str, has_next: bool) -> str:
+        return hashlib.sha256(f'{bf}|{has_next}'.encode()).hexdigest()
+
+    def get(self, key: str):
+        entry = self.regions.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.used.add(key)
+        return entry
+
+    def put(self, key: str, template: str, stage):
+        self.regions[key] = {'template': template, 'stage': stage}
+        self.used.add(key)
+
+    def save(self):
+        data = {
+            'settings': self.settings,
+            'header': self.header,
+            'regions': {k: v for k, v in self.regions.items() if k in self.used},
+        }
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> dict:
+        return {'reused': self.hits, 'rendered': self.misses}
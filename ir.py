@@ -0,0 +1,410 @@
+"""
+Intermediate representation of a BF program.
+
+The program is parsed once into a flat list of `Instruction`s with their jump
+targets resolved. Optimization passes take a `Program` and return a new one,
+and `Play` renders straight from the result.
+"""
+
+I_LEFT = '<'
+I_RIGHT = '>'
+I_INC = '+'
+I_DEC = '-'
+I_JMP_BGN = '['
+I_JMP_END = ']'
+I_IN = ','
+I_OUT = '.'
+
+# instructions that only exist after optimization
+OP_ADD = 'add'  # count: net change to the cell (mod 256), from a folded run of '+'/'-'
+                # data: True if the cell is known not to wrap around (see `drop_dead_loops`)
+OP_MUL = 'mul'  # data: {cell offset: amount of the cell's value to add there}, then the cell is cleared
+OP_MOVE = 'move'  # count: cells to move the pointer by, negative for left
+OP_ADD_AT = 'add_at'  # count: change to the cell next to the pointer (data: -1 or 1), which stays put
+OP_SCAN = 'scan'  # count: like OP_MOVE, the whole body of a scan loop ('[>]', '[<<]'), which goes straight back to its '['
+OP_PRINT = 'print'  # data: bytes to output
+OP_TAPE = 'tape'  # data: tuple of cells from the first one, count: index of the pointer
+
+
+class Instruction:
+    __slots__ = ('op', 'count', 'target', 'depth', 'act', 'scene', 'data', 'source')
+
+    def __init__(self, op: str, count: int = 1, source: int = -1, data=None):
+        self.op = op
+        self.count = count
+        self.target = -1  # index of the matching bracket, for '[' and ']'
+        self.depth = 0  # bracket depth, the outermost level is 0
+        self.act = 0  # act starting at this instruction, if any
+        self.scene = 0  # scene starting at this instruction, if any
+        self.data = data
+        self.source = source  # index into the original BF
+
+    def __repr__(self):
+        return f'Instruction({self.op!r}, count={self.count}, target={self.target}, source={self.source})'
+
+
+class Program:
+    def __init__(self, instructions: list):
+        self.instructions = instructions
+        self.link()
+
+    @classmethod
+    def parse(cls, bf: str) -> 'Program':
+        """One instruction per BF symbol. `bf` must already be filtered."""
+        return cls([Instruction(c, source=i) for i, c in enumerate(bf)])
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def __getitem__(self, index: int) -> Instruction:
+        return self.instructions[index]
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def link(self):
+        """Matches up brackets and records the depth of each instruction."""
+        open_brackets = []
+        for i, ins in enumerate(self.instructions):
+            if ins.op == I_JMP_BGN:
+                ins.depth = len(open_brackets)
+                open_brackets.append(i)
+            elif ins.op == I_JMP_END:
+                if len(open_brackets) == 0:
+                    raise Exception("Unmatched ']' at index " + str(ins.source))
+                start = open_brackets.pop()
+                ins.target = start
+                self.instructions[start].target = i
+                ins.depth = len(open_brackets)
+            else:
+                ins.depth = len(open_brackets)
+        if len(open_brackets) > 0:
+            raise Exception("Unmatched '['!")
+
+    def number_acts(self):
+        """
+        Every bracket is a jump destination, so each one starts a scene.
+        Outermost ones start a new act (introductions happen in Act I).
+        """
+        act = 1
+        scene = 2
+        for ins in self.instructions:
+            ins.act = ins.scene = 0
+            if ins.op not in (I_JMP_BGN, I_JMP_END):
+                continue
+            if ins.depth == 0:
+                act += 1
+                ins.act = act
+                ins.scene = 1
+                scene = 2
+            else:
+                ins.scene = scene
+                scene += 1
+
+
+def fold_runs(program: Program) -> Program:
+    """
+    Collapses each run of '+' and '-' into one `OP_ADD`
+    of the net change (mod 256), dropping runs that cancel out.
+    """
+    out = []
+    delta = None
+    for ins in program:
+        if ins.op in (I_INC, I_DEC):
+            if delta is None:
+                delta = 0
+                start = ins.source
+            delta += 1 if ins.op == I_INC else -1
+            continue
+        if delta is not None:
+            _append_add(out, delta, start)
+            delta = None
+        out.append(ins)
+    if delta is not None:
+        _append_add(out, delta, start)
+    return Program(out)
+
+
+def _append_add(out: list, delta: int, source: int):
+    # pick whichever direction is shorter, so the noun phrase is small
+    delta %= 256
+    if delta > 128:
+        delta -= 256
+    if delta != 0:
+        out.append(Instruction(OP_ADD, delta, source))
+
+
+def find_loop_idioms(program: Program) -> Program:
+    """
+    Replaces innermost loops that only shuffle and add, end up where they started,
+    and change the starting cell by exactly 1 each time around with an `OP_MUL`.
+    These run a known number of times (the cell's value, or 256 minus it),
+    so each other cell they touch just gets a multiple of the starting cell added to it.
+    """
+    out = []
+    for ins in program:
+        out.append(ins)
+        if ins.op != I_JMP_END:
+            continue
+        # walk back to the matching '[' in `out`, giving up at anything but +-<>
+        offset = 0
+        deltas = {}
+        j = len(out) - 2
+        while j >= 0 and out[j].op in (I_LEFT, I_RIGHT, I_INC, I_DEC, OP_ADD):
+            j -= 1
+        if j < 0 or out[j].op != I_JMP_BGN:
+            continue
+        for body in out[j + 1:-1]:
+            if body.op == I_RIGHT:
+                offset += body.count
+            elif body.op == I_LEFT:
+                offset -= body.count
+            else:
+                d = body.count if body.op == OP_ADD else (1 if body.op == I_INC else -1)
+                deltas[offset] = deltas.get(offset, 0) + d
+        step = deltas.pop(0, 0) % 256
+        if offset != 0 or step not in (1, 255):
+            continue
+        step = 1 if step == 1 else -1
+        # counting up runs (256 - value) times, which is -value mod 256
+        multiples = {o: (-step * d) % 256 for o, d in deltas.items() if (-step * d) % 256}
+        source = out[j].source
+        del out[j:]
+        out.append(Instruction(OP_MUL, source=source, data=multiples))
+    return Program(out)
+
+
+def track_offsets(program: Program) -> Program:
+    """
+    Rewrites each straight run of '+', '-', '<' and '>' so that the pointer moves as little as possible:
+    every cell the run changes gets its net change in one go, in the order the pointer gets to it,
+    moves between them become a single `OP_MOVE`, and a cell just past either end
+    of where the pointer has to go anyway is changed from its neighbour (`OP_ADD_AT`).
+    A loop that only moves the pointer (a scan loop, like '[>]') gets an `OP_SCAN` for its body,
+    which skips the test at its ']': the one at its '[' is all it needs.
+    """
+    out = []
+    run = []
+    for ins in program:
+        if ins.op in (I_LEFT, I_RIGHT, I_INC, I_DEC, OP_ADD, OP_MOVE):
+            run.append(ins)
+            continue
+        _append_run(out, run)
+        run = []
+        if ins.op == I_JMP_END and len(out) >= 2 and out[-2].op == I_JMP_BGN and out[-1].op == OP_MOVE:
+            out[-1] = Instruction(OP_SCAN, out[-1].count, out[-1].source)
+        out.append(ins)
+    _append_run(out, run)
+    return Program(out)
+
+
+def _append_run(out: list, run: list):
+    if not run:
+        return
+    source = run[0].source
+    end = 0
+    deltas = {}
+    for ins in run:
+        if ins.op in (I_RIGHT, I_LEFT, OP_MOVE):
+            end += -ins.count if ins.op == I_LEFT else ins.count
+        else:
+            d = ins.count if ins.op == OP_ADD else (1 if ins.op == I_INC else -1)
+            deltas[end] = deltas.get(end, 0) + d
+    # same normalization as `_append_add`
+    targets = {}
+    for o, d in deltas.items():
+        d %= 256
+        if d > 128:
+            d -= 256
+        if d != 0:
+            targets[o] = d
+
+    # the pointer sweeps from `left` to `right` (or the other way), whichever way is shorter overall
+    lo = min([0, end] + list(targets))
+    hi = max([0, end] + list(targets))
+    left = lo + 1 if lo < min(0, end) else lo
+    right = hi - 1 if hi > max(0, end) else hi
+    if abs(left) + abs(end - right) <= abs(right) + abs(end - left):
+        stops = [left, right, end]
+    else:
+        stops = [right, left, end]
+
+    pos = 0
+    moved = 0
+
+    def visit(p: int):
+        nonlocal moved
+        todo = [p] if p in targets else []
+        if p == left and p - 1 in targets and p - 1 < left:
+            todo.append(p - 1)
+        if p == right and p + 1 in targets and p + 1 > right:
+            todo.append(p + 1)
+        if not todo:
+            return
+        if moved:
+            out.append(Instruction(OP_MOVE, moved, source))
+            moved = 0
+        for t in todo:
+            if t == p:
+                out.append(Instruction(OP_ADD, targets.pop(t), source))
+            else:
+                out.append(Instruction(OP_ADD_AT, targets.pop(t), source, data=t - p))
+
+    visit(pos)
+    for stop in stops:
+        step = 1 if stop > pos else -1
+        while pos != stop:
+            pos += step
+            moved += step
+            visit(pos)
+    if moved:
+        out.append(Instruction(OP_MOVE, moved, source))
+
+
+def partial_eval(program: Program, max_steps: int = 1_000_000) -> Program:
+    """
+    Runs as much of the program as possible before translating it: up to the first ',',
+    or `max_steps` instructions, or the pointer going left of the first cell.
+    Everything up to the last top-level instruction it got to is replaced
+    with an `OP_PRINT` of what it printed and an `OP_TAPE` setting up the cells it left behind,
+    so a program that never reads input is just its output.
+    """
+    instructions = program.instructions
+    index, tape, pointer, output, resume_steps = _run(instructions, max_steps)
+    if index < len(instructions):
+        # it can only pick up again between top-level instructions, so go back to the last one
+        index, tape, pointer, output, _ = _run(instructions, resume_steps)
+    if index == 0:
+        return program
+
+    out = []
+    if output:
+        out.append(Instruction(OP_PRINT, source=0, data=bytes(output)))
+    if index < len(instructions):
+        # cells past the pointer that are still 0 are what the tape starts out as anyway
+        end = len(tape)
+        while end > pointer + 1 and tape[end - 1] == 0:
+            end -= 1
+        out.append(Instruction(OP_TAPE, pointer, source=0, data=tuple(tape[:end])))
+    return Program(out + instructions[index:])
+
+
+def _run(instructions: list, max_steps: int) -> tuple:
+    """
+    Interprets `instructions` until it needs input, goes left of the first cell, ends, or runs `max_steps`.
+    Returns the index of the instruction it stopped at, the tape, the pointer, the output
+    and how many steps it took to get to the last top-level instruction.
+    """
+    tape = [0] * 16
+    pointer = 0
+    output = bytearray()
+    resume_steps = 0
+    i = 0
+    steps = 0
+    while i < len(instructions) and steps < max_steps:
+        ins = instructions[i]
+        op = ins.op
+        if ins.depth == 0 and op != I_JMP_END:
+            resume_steps = steps
+        if op == I_IN:
+            break
+        # the furthest cells this instruction touches
+        if op in (I_RIGHT, I_LEFT, OP_MOVE, OP_SCAN):
+            touched = (pointer + (-ins.count if op == I_LEFT else ins.count),)
+        elif op == OP_ADD_AT:
+            touched = (pointer + ins.data,)
+        elif op == OP_MUL and ins.data:
+            touched = (pointer + min(ins.data), pointer + max(ins.data))
+        else:
+            touched = ()
+        if any(t < 0 for t in touched):
+            break
+        for t in touched:
+            if t >= len(tape):
+                tape.extend([0] * (t + 1 - len(tape)))
+
+        steps += 1
+        if op == I_INC:
+            tape[pointer] = (tape[pointer] + 1) % 256
+        elif op == I_DEC:
+            tape[pointer] = (tape[pointer] - 1) % 256
+        elif op == OP_ADD:
+            tape[pointer] = (tape[pointer] + ins.count) % 256
+        elif op == OP_ADD_AT:
+            tape[pointer + ins.data] = (tape[pointer + ins.data] + ins.count) % 256
+        elif op in (I_RIGHT, I_LEFT, OP_MOVE, OP_SCAN):
+            # an `OP_SCAN`'s loop test is left to its ']', which comes to the same thing
+            pointer = touched[0]
+        elif op == OP_MUL:
+            for o, m in ins.data.items():
+                tape[pointer + o] = (tape[pointer + o] + tape[pointer] * m) % 256
+            tape[pointer] = 0
+        elif op == I_OUT:
+            output.append(tape[pointer])
+        elif op == I_JMP_BGN:
+            if tape[pointer] == 0:
+                i = ins.target
+        elif op == I_JMP_END:
+            if tape[pointer] != 0:
+                i = ins.target
+        i += 1
+    if i < len(instructions) and instructions[i].depth == 0 and instructions[i].op != I_JMP_END:
+        resume_steps = steps
+    return i, tape, pointer, output, resume_steps
+
+
+def drop_dead_loops(program: Program) -> Program:
+    """
+    Follows what's known about the cells through the program (all 0 at the start, 0 after a loop, ...)
+    to drop loops that can never run, like one at the very start or one right after another loop,
+    and to mark the `OP_ADD`s that can't wrap around (their net change adjusted for the wrap, if it's certain).
+    Inside a loop nothing is known, since it could be on any time around.
+    """
+    out = []
+    cells = {}  # absolute position -> value, or None if it's unknown
+    fresh = True  # whether cells not in `cells` are known to be 0
+    pointer = 0
+
+    def value(p: int):
+        return cells.get(p, 0 if fresh else None)
+
+    instructions = program.instructions
+    i = 0
+    while i < len(instructions):
+        ins = instructions[i]
+        op = ins.op
+        if op == I_JMP_BGN:
+            if value(pointer) == 0:
+                # skip it, the loop's ']' included
+                i = ins.target + 1
+                continue
+            cells, fresh, pointer = {}, False, 0
+        elif op == I_JMP_END:
+            cells, fresh, pointer = {0: 0}, False, 0
+        elif op in (I_INC, I_DEC, OP_ADD):
+            delta = ins.count if op == OP_ADD else (1 if op == I_INC else -1)
+            v = value(pointer)
+            if v is not None:
+                cells[pointer] = (v + delta) % 256
+                if op == OP_ADD:
+                    ins = Instruction(OP_ADD, cells[pointer] - v, ins.source, data=True)
+            else:
+                cells[pointer] = None
+        elif op == OP_ADD_AT:
+            v = value(pointer + ins.data)
+            cells[pointer + ins.data] = None if v is None else (v + ins.count) % 256
+        elif op in (I_LEFT, I_RIGHT, OP_MOVE, OP_SCAN):
+            pointer += -ins.count if op == I_LEFT else ins.count
+        elif op == I_IN:
+            cells[pointer] = None
+        elif op == OP_MUL:
+            v = value(pointer)
+            for o, m in ins.data.items():
+                target = value(pointer + o)
+                cells[pointer + o] = None if v is None or target is None else (target + v * m) % 256
+            cells[pointer] = 0
+        elif op == OP_TAPE:
+            cells, fresh, pointer = dict(enumerate(ins.data)), True, ins.count
+        out.append(ins)
+        i += 1
+    return Program(out)
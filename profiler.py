@@ -0,0 +1,152 @@
+"""
+Records where a translation spends its time: phases of `Play`, calls to the writer,
+and (in AI mode) every API request with its latency and token usage.
+
+The report is plain JSON (see `Profiler.report`), and `chrome_trace` writes the same timings
+in the Trace Event format, for chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import time
+import threading
+import functools
+import contextlib
+
+# upper bounds (in seconds) of the latency histogram buckets
+HISTOGRAM_BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+
+
+def _bucket_name(bound: float) -> str:
+    if bound < 1e-3:
+        return f'<{bound * 1e6:g}us'
+    if bound < 1:
+        return f'<{bound * 1e3:g}ms'
+    return f'<{bound:g}s'
+
+
+class Profiler:
+    """
+    A disabled profiler records nothing, so that code can use one unconditionally.
+    Every single timing is only kept (for `chrome_trace`) with `trace`.
+    Everything can be recorded from any thread.
+    """
+    def __init__(self, enabled: bool = True, trace: bool = False):
+        self.enabled = enabled
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases = {}  # name -> [seconds, count]
+        self.calls = {}  # name -> list of latencies
+        self.requests = []  # one dict per API request
+        self.events = []  # (name, category, start, seconds, thread id)
+
+    def _add_event(self, name: str, category: str, start: float, seconds: float):
+        if self.trace:
+            self.events.append((name, category, start, seconds, threading.get_ident()))
+
+    @contextlib.contextmanager
+    def _phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                totals = self.phases.setdefault(name, [0.0, 0])
+                totals[0] += seconds
+                totals[1] += 1
+                self._add_event(name, 'phase', start, seconds)
+
+    def phase(self, name: str):
+        """Context manager that times a phase, adding up every time the same phase runs."""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._phase(name)
+
+    def wrap(self, name: str, f):
+        """`f`, but every call is timed under `name`."""
+        if not self.enabled:
+            return f
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                with self.lock:
+                    self.calls.setdefault(name, []).append(seconds)
+                    self._add_event(name, 'call', start, seconds)
+        return wrapper
+
+    def request(self, start: float, cached: bool, usage: dict = None):
+        """Records an API request that started at `start` (a `time.perf_counter()`) and just finished."""
+        if not self.enabled:
+            return
+        seconds = time.perf_counter() - start
+        usage = usage or {}
+        with self.lock:
+            self.requests.append({
+                'start': start - self.start,
+                'seconds': seconds,
+                'cached': cached,
+                'prompt_tokens': usage.get('prompt_tokens'),
+                'completion_tokens': usage.get('completion_tokens'),
+            })
+            self._add_event('request (cached)' if cached else 'request', 'request', start, seconds)
+
+    def report(self, **extra) -> dict:
+        """Everything recorded so far, plus `extra` (output size, cache stats, ...)."""
+        with self.lock:
+            phases = {name: {'seconds': s, 'count': n} for name, (s, n) in self.phases.items()}
+            writer = {name: self._call_summary(latencies) for name, latencies in self.calls.items()}
+            requests = list(self.requests)
+        report = {
+            'seconds': time.perf_counter() - self.start,
+            'phases': phases,
+            'writer': writer,
+            'requests': {
+                'count': len(requests),
+                'cached': sum(1 for r in requests if r['cached']),
+                'seconds': sum(r['seconds'] for r in requests),
+                'prompt_tokens': sum(r['prompt_tokens'] or 0 for r in requests),
+                'completion_tokens': sum(r['completion_tokens'] or 0 for r in requests),
+                'each': requests,
+            },
+        }
+        report.update(extra)
+        return report
+
+    @staticmethod
+    def _call_summary(latencies: list) -> dict:
+        histogram = {_bucket_name(bound): 0 for bound in HISTOGRAM_BUCKETS}
+        histogram['slower'] = 0
+        for seconds in latencies:
+            for bound in HISTOGRAM_BUCKETS:
+                if seconds < bound:
+                    histogram[_bucket_name(bound)] += 1
+                    break
+            else:
+                histogram['slower'] += 1
+        total = sum(latencies)
+        return {
+            'calls': len(latencies),
+            'seconds': total,
+            'mean_seconds': total / len(latencies) if latencies else 0.0,
+            'max_seconds': max(latencies, default=0.0),
+            'histogram': histogram,
+        }
+
+    def chrome_trace(self, path: str):
+        with self.lock:
+            events = [{
+                'name': name,
+                'cat': category,
+                'ph': 'X',
+                'ts': (start - self.start) * 1e6,
+                'dur': seconds * 1e6,
+                'pid': 0,
+                'tid': tid,
+            } for name, category, start, seconds, tid in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
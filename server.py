@@ -0,0 +1,179 @@
+"""
+Translation server: keeps writers, word lists and caches warm between requests,
+so translating a program costs a request instead of starting Python (and in AI mode, openai) every time.
+
+Every request gets a writer to itself, taken from a pool of idle ones and given back afterwards.
+
+Usage:
+    python server.py --port 8421 --cache
+    curl --data-binary @input_bf.b 'http://127.0.0.1:8421/translate?mode=boring&O=2&lazy_stage=1'
+    curl http://127.0.0.1:8421/stats
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import contextlib
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import words
+from bf2spl import Play, filter_bf
+
+DEFAULT_PORT = 8421
+
+
+class WriterPool:
+    """Idle writers made by `factory`, handed out one request at a time."""
+    def __init__(self, factory):
+        self.factory = factory
+        self.idle = []
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def writer(self):
+        with self.lock:
+            writer = self.idle.pop() if self.idle else None
+            if writer is None:
+                self.created += 1
+        if writer is None:
+            writer = self.factory()
+        try:
+            yield writer
+        finally:
+            with self.lock:
+                self.idle.append(writer)
+
+
+class TranslationServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple, response_cache=None, concurrency: int = 1, pool_size: int = 0,
+                 verbose: bool = False):
+        super().__init__(address, TranslationHandler)
+        self.response_cache = response_cache
+        self.verbose = verbose
+        self.writers = {
+            'boring': WriterPool(self._boring_writer),
+            'ai': WriterPool(lambda: self._ai_writer(concurrency, pool_size)),
+        }
+        # the global random state is shared, so seeded requests take turns
+        self.seed_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.seconds = 0.0
+        # load these now rather than during the first request
+        words.load()
+
+    @staticmethod
+    def _boring_writer():
+        from writers.default_writer import RandomWriter
+        return RandomWriter()
+
+    def _ai_writer(self, concurrency: int, pool_size: int):
+        from writers.ai_writer import ChatGptWriter
+        return ChatGptWriter(max_concurrency=concurrency, response_cache=self.response_cache, pool_size=pool_size)
+
+    def translate(self, bf: str, mode: str = 'boring', opt_level: int = 0, lazy_stage: bool = False,
+                  seed: int = None) -> str:
+        if mode not in self.writers:
+            raise Exception(f'Unknown mode {mode!r}')
+        with self.writers[mode].writer() as writer:
+            if seed is None:
+                return Play(bf, writer=writer, opt_level=opt_level, lazy_stage=lazy_stage).render_spl()
+            with self.seed_lock:
+                random.seed(seed)
+                return Play(bf, writer=writer, opt_level=opt_level, lazy_stage=lazy_stage).render_spl()
+
+    def record(self, seconds: float, failed: bool):
+        with self.stats_lock:
+            self.requests += 1
+            self.failures += failed
+            self.seconds += seconds
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            stats = {
+                'requests': self.requests,
+                'failures': self.failures,
+                'seconds': self.seconds,
+                'writers': {mode: pool.created for mode, pool in self.writers.items()},
+            }
+        if self.response_cache is not None:
+            stats['ai_response_cache'] = self.response_cache.stats()
+        return stats
+
+
+class TranslationHandler(BaseHTTPRequestHandler):
+    """
+    POST /translate with the BF as the body; the options are query parameters:
+    `mode` (boring/ai), `O` (optimization level), `lazy_stage` (0/1) and `seed`.
+    Replies with the play, or 400 and the error if it can't be translated.
+    GET /stats replies with request counts and cache stats as JSON.
+    """
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/translate':
+            return self._reply(404, 'Not found\n')
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        bf = filter_bf(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8', 'replace'))
+        start = time.perf_counter()
+        try:
+            text = self.server.translate(bf, params.get('mode', 'boring').lower(), int(params.get('O', 0)),
+                                         params.get('lazy_stage', '0') not in ('0', '', 'false'),
+                                         int(params['seed']) if 'seed' in params else None)
+        except Exception as e:
+            self.server.record(time.perf_counter() - start, True)
+            return self._reply(400, f'{type(e).__name__}: {e}\n')
+        self.server.record(time.perf_counter() - start, False)
+        self._reply(200, text + '\n')
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            return self._reply(404, 'Not found\n')
+        self._reply(200, json.dumps(self.server.stats(), indent=2) + '\n', 'application/json')
+
+    def _reply(self, status: int, body: str, content_type: str = 'text/plain; charset=utf-8'):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve BF to SPL translations over HTTP on localhost.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='number of requests each AI writer can make at once (default: 1)')
+    parser.add_argument('--pool', type=int, default=0,
+                        help='have AI writers request this many words at a time instead of one per statement')
+    parser.add_argument('--cache', nargs='?', const=os.path.join('logs', 'ai-cache.sqlite'),
+                        help='keep AI responses in this SQLite file (default: logs/ai-cache.sqlite)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log every request')
+    cmd_args = parser.parse_args()
+
+    response_cache = None
+    if cmd_args.cache:
+        from writers.ai_cache import ResponseCache
+        response_cache = ResponseCache(cmd_args.cache)
+    server = TranslationServer((cmd_args.host, cmd_args.port), response_cache, cmd_args.concurrency, cmd_args.pool,
+                               cmd_args.verbose)
+    print(f'Listening on http://{cmd_args.host}:{server.server_port}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,471 @@
+"""
+Interpreter for the SPL that `Play` writes.
+
+The play is parsed once and every sentence is compiled into a Python closure
+with its goto target already resolved, so running it is just a loop over a flat list.
+Cells are bytes: 'Speak your mind' writes a byte, and 'Open your mind' reads one (-1 at EOF).
+
+Usage:
+    python spl.py play.spl < input
+"""
+import re
+import sys
+import argparse
+
+import words
+from util import from_roman_numeral
+from words import ARTICLES, InvalidPhrase
+
+WORDS = words.load()
+NEGATIVE_NOUNS = WORDS.negative_nouns
+NOTHING = WORDS.nothings
+FIRST_PERSON = frozenset(['i', 'me', 'myself'])
+SECOND_PERSON = frozenset(['you', 'thee', 'thou', 'thyself', 'yourself'])
+GREATER = WORDS.positive_comparatives
+LESS = WORDS.negative_comparatives
+
+ACT_RE = re.compile(r'^\s*Act ([IVXLCDM]+):')
+SCENE_RE = re.compile(r'^\s*Scene ([IVXLCDM]+):')
+STAGE_RE = re.compile(r'^\s*\[\s*(Enter|Exit|Exeunt)\b\s*(.*?)\s*\]\s*$')
+SPEECH_RE = re.compile(r'^\s*([^:\[\]]+?)\s*:\s*(.*)$')
+
+CONDITIONAL_RE = re.compile(r'^if (so|not),\s*(.*)$')
+ASSIGN_RE = re.compile(r"^(?:you are|thou art|you're)\s+(?:as ([\w-]+) as\s+)?(.*)$")
+REMEMBER_RE = re.compile(r'^remember\s+(.*)$')
+QUESTION_RE = re.compile(r'^(am i|are you|art thou|is ([\w-]+))\s+(not\s+)?'
+                         r'(?:as ([\w-]+) as|(more|less) [\w-]+ than|([\w-]+) than)\s+(.*)$')
+GOTO_RE = re.compile(r'^(?:let us|we shall|we must) (?:proceed|return) to (act|scene) ([ivxlcdm]+)$')
+
+
+class SPLError(Exception):
+    pass
+
+
+class Character:
+    __slots__ = ('name', 'value', 'stack')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+        self.stack = []
+
+
+def _sentences(text: str):
+    """Splits a line of dialog into sentences. 'Recall' takes the rest of the line as fluff."""
+    text = text.strip()
+    while text:
+        if text.lower().startswith('recall'):
+            yield text
+            return
+        m = re.search(r'[.!?]', text)
+        if m is None:
+            yield text
+            return
+        yield text[:m.end()]
+        text = text[m.end():].strip()
+
+
+def _trunc_div(a: int, b: int) -> int:
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+BINARY_OPS = {
+    'sum': lambda a, b: a + b,
+    'difference': lambda a, b: a - b,
+    'product': lambda a, b: a * b,
+    'quotient': _trunc_div,
+    'remainder': lambda a, b: a - b * _trunc_div(a, b),
+}
+
+
+class SPLProgram:
+    """
+    With `strict`, every noun and adjective has to be in the SPL word lists (see words.py);
+    otherwise, phrases that aren't are still understood when their meaning is clear.
+    """
+    def __init__(self, text: str, strict: bool = False):
+        self.strict = strict
+        self.title = ''
+        self.characters = {}  # lowercase name -> Character
+        self.ops = []  # compiled statements; each returns the index of the next one, or None to fall through
+        self.op_lines = []  # line number of each op, for errors
+        self.stage = []
+        self.flag = None  # answer to the last question
+        self.steps = 0  # statements executed by the last `run`
+        self._input = b''
+        self._input_pos = 0
+        self._output = bytearray()
+        self._parse(text)
+
+    # parsing
+
+    def _parse(self, text: str):
+        lines = text.split('\n')
+        i = 0
+        while i < len(lines) and not lines[i].strip():
+            i += 1
+        if i == len(lines):
+            raise SPLError('Empty play')
+        self.title = lines[i].strip()
+        i += 1
+
+        # dramatis personae, up until the first act
+        while i < len(lines) and not ACT_RE.match(lines[i]):
+            if lines[i].strip():
+                name = lines[i].split(',')[0].strip()
+                self.characters[name.lower()] = Character(name)
+            i += 1
+
+        acts = {}  # act # -> (first op, {scene # -> first op})
+        gotos = []  # (target cell, act the goto is in, 'act' or 'scene', number, line #)
+        act = None
+        for lineno in range(i, len(lines)):
+            line = lines[lineno]
+            if not line.strip():
+                continue
+            m = ACT_RE.match(line)
+            if m:
+                act = from_roman_numeral(m.group(1))
+                acts[act] = (len(self.ops), {})
+                continue
+            m = SCENE_RE.match(line)
+            if m:
+                if act is None:
+                    raise SPLError(f'line {lineno + 1}: scene outside of an act')
+                acts[act][1][from_roman_numeral(m.group(1))] = len(self.ops)
+                continue
+            m = STAGE_RE.match(line)
+            if m:
+                self._add(self._compile_stage(m.group(1), m.group(2), lineno + 1), lineno + 1)
+                continue
+            m = SPEECH_RE.match(line)
+            if m and m.group(1).lower() in self.characters:
+                speaker = self.characters[m.group(1).lower()]
+                for sentence in _sentences(m.group(2)):
+                    self._add(self._compile_sentence(sentence, speaker, act, gotos, lineno + 1), lineno + 1)
+                continue
+            raise SPLError(f"line {lineno + 1}: can't understand {line.strip()!r}")
+
+        for target, goto_act, kind, number, lineno in gotos:
+            if kind == 'act':
+                if number not in acts:
+                    raise SPLError(f'line {lineno}: no Act {number}')
+                target[0] = acts[number][0]
+            else:
+                if number not in acts[goto_act][1]:
+                    raise SPLError(f'line {lineno}: no Scene {number} in Act {goto_act}')
+                target[0] = acts[goto_act][1][number]
+
+    def _add(self, op, lineno: int):
+        self.ops.append(op)
+        self.op_lines.append(lineno)
+
+    def _character(self, name: str, lineno: int) -> Character:
+        if name.lower() not in self.characters:
+            raise SPLError(f'line {lineno}: {name!r} is not in the dramatis personae')
+        return self.characters[name.lower()]
+
+    def _compile_stage(self, verb: str, names: str, lineno: int):
+        names = [n for n in re.split(r',\s*|\s+and\s+', names) if n]
+        characters = [self._character(n, lineno) for n in names]
+        stage = self.stage
+
+        if verb == 'Enter':
+            def op():
+                for c in characters:
+                    if c in stage:
+                        raise SPLError(f'{c.name} is already on stage')
+                    stage.append(c)
+        elif characters:
+            def op():
+                for c in characters:
+                    if c not in stage:
+                        raise SPLError(f'{c.name} is not on stage')
+                    stage.remove(c)
+        else:
+            def op():
+                stage.clear()
+        return op
+
+    def _listener(self, speaker: Character) -> Character:
+        stage = self.stage
+        if len(stage) != 2 or speaker not in stage:
+            raise SPLError(f'{speaker.name} needs to be on stage with exactly one other character')
+        return stage[1] if stage[0] is speaker else stage[0]
+
+    def _compile_sentence(self, sentence: str, speaker: Character, act: int, gotos: list, lineno: int):
+        s = ' '.join(sentence.lower().split())
+        s = s.rstrip('.!?').strip()
+        listener = self._listener
+
+        m = CONDITIONAL_RE.match(s)
+        if m:
+            want = m.group(1) == 'so'
+            inner = self._compile_sentence(m.group(2), speaker, act, gotos, lineno)
+
+            def op():
+                if self.flag is None:
+                    raise SPLError('no question has been asked')
+                if self.flag is want:
+                    return inner()
+            return op
+
+        m = GOTO_RE.match(s)
+        if m:
+            target = [None]
+            gotos.append((target, act, m.group(1), from_roman_numeral(m.group(2).upper()), lineno))
+            return lambda: target[0]
+
+        if s.startswith('recall'):
+            def op():
+                c = listener(speaker)
+                if not c.stack:
+                    raise SPLError(f"{c.name}'s stack is empty")
+                c.value = c.stack.pop()
+            return op
+
+        if s == 'speak your mind':
+            output = self._output
+
+            def op():
+                v = listener(speaker).value
+                if not 0 <= v < 256:
+                    raise SPLError(f"can't speak the value {v}")
+                output.append(v)
+            return op
+
+        if s == 'open your mind':
+            def op():
+                c = listener(speaker)
+                if self._input_pos < len(self._input):
+                    c.value = self._input[self._input_pos]
+                    self._input_pos += 1
+                else:
+                    c.value = -1
+            return op
+
+        if s == 'open your heart':
+            output = self._output
+
+            def op():
+                output.extend(str(listener(speaker).value).encode())
+            return op
+
+        m = ASSIGN_RE.match(s)
+        if m:
+            self._check_adjective(m.group(1), lineno)
+            value = self._compile_value(m.group(2), speaker, lineno)
+
+            def op():
+                listener(speaker).value = value()
+            return op
+
+        m = REMEMBER_RE.match(s)
+        if m:
+            value = self._compile_value(m.group(1), speaker, lineno)
+
+            def op():
+                listener(speaker).stack.append(value())
+            return op
+
+        m = QUESTION_RE.match(s)
+        if m:
+            subject, name, negated, adjective, more_less, comparative, rest = m.groups()
+            self._check_adjective(adjective, lineno)
+            if subject == 'am i':
+                left = lambda: speaker.value
+            elif name is not None:
+                c = self._character(name, lineno)
+                left = lambda: c.value
+            else:
+                left = lambda: listener(speaker).value
+            right = self._compile_value(rest, speaker, lineno)
+            negated = negated is not None
+            if more_less == 'more' or comparative in GREATER:
+                compare = lambda a, b: a > b
+            elif more_less == 'less' or comparative in LESS:
+                compare = lambda a, b: a < b
+            elif more_less is None and comparative is None:
+                compare = lambda a, b: a == b
+            else:
+                raise SPLError(f"line {lineno}: unknown comparative {comparative!r}")
+
+            def op():
+                self.flag = compare(left(), right()) is not negated
+            return op
+
+        raise SPLError(f"line {lineno}: can't understand {sentence!r}")
+
+    def _check_adjective(self, adjective: str, lineno: int):
+        """In strict mode, the adjective in 'as ... as' has to be a real one."""
+        if self.strict and adjective is not None and not WORDS.is_adjective(adjective):
+            raise SPLError(f'line {lineno}: {adjective!r} is not an adjective')
+
+    def _compile_value(self, text: str, speaker: Character, lineno: int):
+        tokens = text.split()
+        tree, pos = self._parse_value(tokens, 0, lineno)
+        if pos != len(tokens):
+            raise SPLError(f"line {lineno}: unexpected {' '.join(tokens[pos:])!r}")
+        return self._compile_tree(tree, speaker)
+
+    def _parse_value(self, tokens: list, pos: int, lineno: int):
+        def expect(*words):
+            nonlocal pos
+            for w in words:
+                if pos >= len(tokens) or tokens[pos] != w:
+                    raise SPLError(f'line {lineno}: expected {w!r} in {" ".join(tokens)!r}')
+                pos += 1
+
+        if pos >= len(tokens):
+            raise SPLError(f'line {lineno}: missing a value in {" ".join(tokens)!r}')
+        t = tokens[pos]
+        nxt = tokens[pos + 1] if pos + 1 < len(tokens) else None
+        if t == 'the' and nxt in BINARY_OPS:
+            pos += 2
+            if nxt == 'remainder':
+                expect('of', 'the', 'quotient', 'between')
+            elif nxt in ('difference', 'quotient'):
+                expect('between')
+            else:
+                expect('of')
+            a, pos = self._parse_value(tokens, pos, lineno)
+            expect('and')
+            b, pos = self._parse_value(tokens, pos, lineno)
+            return (nxt, a, b), pos
+        if t == 'the' and nxt in ('square', 'cube'):
+            pos += 2
+            expect('of')
+            a, pos = self._parse_value(tokens, pos, lineno)
+            return (nxt, a), pos
+        if t == 'twice':
+            a, pos = self._parse_value(tokens, pos + 1, lineno)
+            return ('product', ('const', 2), a), pos
+        if t in FIRST_PERSON:
+            return ('speaker',), pos + 1
+        if t in SECOND_PERSON:
+            return ('listener',), pos + 1
+        if t in NOTHING:
+            return ('const', 0), pos + 1
+        if t in self.characters:
+            return ('character', self.characters[t]), pos + 1
+
+        # noun phrase: [article] adjective* noun, each adjective doubling the noun
+        start = pos
+        while pos < len(tokens) and tokens[pos] != 'and':
+            pos += 1
+        try:
+            return ('const', WORDS.noun_phrase_value(tokens[start:pos])), pos
+        except InvalidPhrase as e:
+            if self.strict:
+                raise SPLError(f'line {lineno}: {e}')
+        # not in the word lists, but the meaning is still clear enough
+        phrase = tokens[start + 1:pos] if t in ARTICLES else tokens[start:pos]
+        if not phrase:
+            raise SPLError(f'line {lineno}: missing a noun in {" ".join(tokens)!r}')
+        noun = phrase[-1]
+        if noun in NOTHING:
+            return ('const', 0), pos
+        sign = -1 if noun in NEGATIVE_NOUNS else 1
+        return ('const', sign * 2 ** (len(phrase) - 1)), pos
+
+    def _compile_tree(self, tree, speaker: Character):
+        """Turns a value tree into a closure, folding constants along the way."""
+        const = self._constant(tree)
+        if const is not None:
+            return lambda: const
+        kind = tree[0]
+        if kind == 'speaker':
+            return lambda: speaker.value
+        if kind == 'listener':
+            listener = self._listener
+            return lambda: listener(speaker).value
+        if kind == 'character':
+            c = tree[1]
+            return lambda: c.value
+        if kind == 'square':
+            a = self._compile_tree(tree[1], speaker)
+            return lambda: a() ** 2
+        if kind == 'cube':
+            a = self._compile_tree(tree[1], speaker)
+            return lambda: a() ** 3
+        f = BINARY_OPS[kind]
+        a = self._compile_tree(tree[1], speaker)
+        b = self._compile_tree(tree[2], speaker)
+        # the common shapes get their own closures, saving a call per evaluation
+        ca, cb = self._constant(tree[1]), self._constant(tree[2])
+        if kind == 'sum' and cb is not None:
+            return lambda: a() + cb
+        if kind == 'difference' and cb is not None:
+            return lambda: a() - cb
+        if kind == 'product' and ca is not None:
+            return lambda: ca * b()
+        return lambda: f(a(), b())
+
+    def _constant(self, tree):
+        kind = tree[0]
+        if kind == 'const':
+            return tree[1]
+        if kind in BINARY_OPS:
+            a, b = self._constant(tree[1]), self._constant(tree[2])
+            if a is None or b is None or (kind in ('quotient', 'remainder') and b == 0):
+                return None
+            return BINARY_OPS[kind](a, b)
+        if kind in ('square', 'cube'):
+            a = self._constant(tree[1])
+            return None if a is None else a ** (2 if kind == 'square' else 3)
+        return None
+
+    # running
+
+    def run(self, stdin: bytes = b'', max_steps: int = None) -> bytes:
+        """
+        Runs the play from the start and returns everything it spoke.
+        Raises `SPLError` if the play does something invalid or runs longer than `max_steps`.
+        """
+        for c in self.characters.values():
+            c.value = 0
+            c.stack.clear()
+        self.stage.clear()
+        self.flag = None
+        self._input = stdin
+        self._input_pos = 0
+        self._output.clear()
+
+        ops = self.ops
+        n = len(ops)
+        limit = max_steps if max_steps is not None else float('inf')
+        pc = 0
+        steps = 0
+        try:
+            while pc < n:
+                nxt = ops[pc]()
+                pc = pc + 1 if nxt is None else nxt
+                steps += 1
+                if steps > limit:
+                    raise SPLError(f'gave up after {max_steps} statements')
+        except (SPLError, ZeroDivisionError) as e:
+            raise SPLError(f'line {self.op_lines[min(pc, n - 1)]}: {e}') from e
+        finally:
+            self.steps = steps
+        return bytes(self._output)
+
+
+def run(text: str, stdin: bytes = b'', max_steps: int = None, strict: bool = False) -> bytes:
+    return SPLProgram(text, strict).run(stdin, max_steps)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run an SPL play (as written by bf2spl) with stdin as its input.')
+    parser.add_argument('play', help='SPL file to run')
+    parser.add_argument('--steps', action='store_true',
+                        help='print the number of statements executed to stderr')
+    parser.add_argument('--strict', action='store_true',
+                        help='reject nouns and adjectives that are not in the SPL word lists')
+    cmd_args = parser.parse_args()
+    with open(cmd_args.play, 'r') as f:
+        program = SPLProgram(f.read(), cmd_args.strict)
+    sys.stdout.buffer.write(program.run(sys.stdin.buffer.read()))
+    sys.stdout.flush()
+    if cmd_args.steps:
+        print(f'{program.steps} statements', file=sys.stderr)
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from writers.ai_cache import ResponseCache, CacheMiss
+
+MESSAGES = [{'role': 'user', 'content': 'Hello'}]
+
+
+def test_get_put(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+    key = cache.key('model', 0.3, MESSAGES)
+    assert cache.get(key) is None
+    cache.put(key, 'Hi', {'prompt_tokens': 1, 'completion_tokens': 1})
+    assert cache.get(key) == ('Hi', {'prompt_tokens': 1, 'completion_tokens': 1})
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    cache.close()
+    # it's still there next time
+    assert ResponseCache(str(tmp_path / 'cache.sqlite')).get(key)[0] == 'Hi'
+
+
+def test_key():
+    key = ResponseCache.key('model', 0.3, MESSAGES)
+    assert key == ResponseCache.key('model', 0.3, [dict(m) for m in MESSAGES])
+    assert key != ResponseCache.key('model', 0.5, MESSAGES)
+    assert key != ResponseCache.key('other', 0.3, MESSAGES)
+    # no variant is the same as before variants
+    assert key == ResponseCache.key('model', 0.3, MESSAGES, None)
+    assert len({key, ResponseCache.key('model', 0.3, MESSAGES, 0), ResponseCache.key('model', 0.3, MESSAGES, 1)}) == 3
+
+
+def _age(cache: ResponseCache, key: str, seconds: float):
+    cache.db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time() - seconds, key))
+    cache.db.commit()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+    keys = [cache.key('model', 0, [{'role': 'user', 'content': str(i)}]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, str(i))
+        _age(cache, key, 30 - i)
+    # using the oldest makes it the newest
+    assert cache.get(keys[0]) == ('0', None)
+    cache.evict()
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+def test_evicts_old(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), max_age_days=1)
+    old, new = cache.key('model', 0, MESSAGES), cache.key('model', 1, MESSAGES)
+    cache.put(old, 'old')
+    cache.put(new, 'new')
+    _age(cache, old, 2 * 24 * 60 * 60)
+    cache.evict()
+    assert cache.get(old) is None
+    assert cache.get(new) == ('new', None)
+
+
+def test_replay_only(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    ResponseCache(path).put('recorded', 'Hi')
+    cache = ResponseCache(path, replay_only=True)
+    assert cache.get('recorded') == ('Hi', None)
+    with pytest.raises(CacheMiss):
+        cache.get('not recorded')
+    assert cache.stats()['misses'] == 1
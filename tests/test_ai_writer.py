@@ -0,0 +1,245 @@
+"""The AI writer, against bench/mock_llm.py where it needs a server, so no key (or network) is needed."""
+import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import bf
+import spl
+from bf2spl import Play
+from bench.mock_llm import MockLLM, MockServer
+from writers import ai_writer
+from writers.ai_writer import ChatGptWriter, VocabularyPool, RequestPolicy, RequestFailed, DeadlineExceeded
+from writers.ai_cache import ResponseCache
+
+PROGRAM = '++++++++[>++++++<-]>+.+.>,[.,]'
+STDIN = b'xyz'
+
+
+@pytest.fixture
+def mock_server():
+    """Starts a `MockServer` (with a `MockLLM` that answers right away) and sends every request to it."""
+    pytest.importorskip('openai')
+    def start(**kwargs) -> MockServer:
+        server = MockServer(('127.0.0.1', 0), MockLLM(seed=0, **kwargs)).start()
+        servers.append(server)
+        ai_writer.set_base_url(server.base_url)
+        return server
+    servers = []
+    base_url = ai_writer.BASE_URL
+    yield start
+    ai_writer.set_base_url(base_url)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def translate(writer, seed: int = 0) -> str:
+    random.seed(seed)
+    return Play(PROGRAM, writer=writer, opt_level=2).render_spl()
+
+
+def assert_runs(text: str):
+    assert spl.run(text, STDIN) == bf.run(PROGRAM, STDIN)
+
+
+def test_replay(mock_server, tmp_path):
+    server = mock_server()
+    path = str(tmp_path / 'cache.sqlite')
+    recorded = translate(ChatGptWriter(response_cache=ResponseCache(path)))
+    assert_runs(recorded)
+    requests = server.mock.stats['requests']
+    assert requests > 0
+    # the same play again, without asking the server anything
+    cache = ResponseCache(path, replay_only=True)
+    writer = ChatGptWriter(response_cache=cache)
+    assert translate(writer) == recorded
+    assert server.mock.stats['requests'] == requests
+    assert cache.misses == 0 and not writer.fallbacks
+
+
+def test_replay_misses_fall_back(mock_server, tmp_path):
+    server = mock_server()
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'), replay_only=True)
+    writer = ChatGptWriter(response_cache=cache)
+    assert_runs(translate(writer))
+    assert server.mock.stats['requests'] == 0
+    assert cache.misses > 0 and sum(writer.fallbacks.values()) > 0
+
+
+class Fetch:
+    """Fetches for a `VocabularyPool`: the words of each one, or RequestFailed."""
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.numbers = []
+
+    def __call__(self, number: int) -> list:
+        self.numbers.append(number)
+        answer = self.answers[number]
+        if answer is RequestFailed:
+            raise RequestFailed('no words')
+        return list(answer)
+
+
+def test_vocabulary_pool():
+    fetch = Fetch('abcd', 'efgh')
+    pool = VocabularyPool(fetch, 4)
+    # more are fetched once it's down to a quarter of the size
+    assert [pool.take() for _ in range(3)] == ['a', 'b', 'c']
+    assert fetch.numbers == [0]
+    assert pool.take() == 'd'
+    assert fetch.numbers == [0, 1]
+    assert [pool.take() for _ in range(4)] == ['e', 'f', 'g', 'h']
+    # after max_fetches, the used words come round again
+    assert sorted(pool.take() for _ in range(8)) == sorted('abcdefgh')
+    assert fetch.numbers == [0, 1]
+
+
+def test_vocabulary_pool_in_background():
+    fetch = Fetch('abcd', 'efgh')
+    with ThreadPoolExecutor(1) as executor:
+        pool = VocabularyPool(fetch, 4, executor.submit)
+        assert ''.join(pool.take() for _ in range(8)) == 'abcdefgh'
+    assert fetch.numbers == [0, 1]
+
+
+def test_vocabulary_pool_failed_fetch():
+    fetch = Fetch(RequestFailed, 'ab', RequestFailed)
+    pool = VocabularyPool(fetch, 4, max_fetches=3)
+    # nothing this time, but that doesn't use up the next fetch
+    assert pool.take() is None
+    assert pool.take() == 'a'
+    assert fetch.numbers == [0, 1]
+    assert pool.take() == 'b'
+    assert pool.take() in ('a', 'b')
+    assert fetch.numbers == [0, 1, 2]
+    assert VocabularyPool(Fetch(RequestFailed), 4, max_fetches=1).take() is None
+
+
+def test_vocabulary_pools(mock_server):
+    requests = {}
+    for pool_size in (0, 8):
+        server = mock_server()
+        writer = ChatGptWriter(pool_size=pool_size)
+        assert_runs(translate(writer))
+        assert not writer.fallbacks
+        requests[pool_size] = server.mock.stats['requests']
+    # a few requests for the play's words, not one per statement
+    assert requests[8] < requests[0]
+
+
+class StatusError(Exception):
+    """Like the errors openai raises for HTTP statuses."""
+    def __init__(self, status_code: int, retry_after: str = None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.response = type('Response', (), {'headers': {} if retry_after is None else {'retry-after': retry_after}})
+
+
+class Call:
+    """A request that fails with each of `errors` in turn, then answers."""
+    def __init__(self, *errors, seconds: float = 0.0):
+        self.errors = list(errors)
+        self.seconds = seconds
+        self.timeouts = []
+
+    def __call__(self, timeout: float) -> str:
+        self.timeouts.append(timeout)
+        attempt = len(self.timeouts) - 1
+        if attempt < len(self.errors):
+            raise self.errors[attempt]
+        time.sleep(self.seconds)
+        return 'answer'
+
+
+def test_policy_retries():
+    policy = RequestPolicy(retries=2, backoff=0)
+    call = Call(StatusError(500), StatusError(429))
+    assert policy.run(call) == 'answer'
+    assert len(call.timeouts) == 3 and policy.counts['retries'] == 2
+    # out of retries
+    call = Call(StatusError(500), StatusError(502), StatusError(503))
+    with pytest.raises(RequestFailed, match='HTTP 503') as e:
+        policy.run(call)
+    assert isinstance(e.value.__cause__, StatusError)
+    assert len(call.timeouts) == 3
+
+
+def test_policy_no_retry_for_bad_requests():
+    call = Call(StatusError(400))
+    with pytest.raises(RequestFailed):
+        RequestPolicy(retries=2, backoff=0).run(call)
+    assert len(call.timeouts) == 1
+
+
+def test_policy_retry_after():
+    start = time.monotonic()
+    assert RequestPolicy(retries=1, backoff=10).run(Call(StatusError(429, retry_after='0.05'))) == 'answer'
+    assert 0.05 <= time.monotonic() - start < 1
+
+
+def test_policy_timeout():
+    policy = RequestPolicy(timeout=0.05)
+    start = time.monotonic()
+    with pytest.raises(RequestFailed, match='No response'):
+        policy.run(Call(seconds=1))
+    assert time.monotonic() - start < 0.5
+    assert policy.counts['timeouts'] == 1
+    call = Call()
+    assert policy.run(call) == 'answer' and call.timeouts == [0.05]
+
+
+def test_policy_hedging():
+    class Stuck(Call):
+        """The first attempt takes a second, the duplicate answers right away."""
+        def __call__(self, timeout: float) -> str:
+            self.seconds = 1 if not self.timeouts else 0
+            return super().__call__(timeout)
+
+    policy = RequestPolicy(timeout=5, hedge_after=0.05)
+    start = time.monotonic()
+    call = Stuck()
+    assert policy.run(call) == 'answer'
+    assert time.monotonic() - start < 0.5
+    assert len(call.timeouts) == 2 and policy.counts['hedges'] == 1
+    # a quick answer doesn't need a duplicate
+    call = Call()
+    assert policy.run(call) == 'answer' and len(call.timeouts) == 1
+    assert policy.counts['hedges'] == 1
+
+
+def test_policy_deadline():
+    call = Call()
+    with pytest.raises(DeadlineExceeded):
+        RequestPolicy(deadline=time.monotonic() - 1).run(call)
+    assert call.timeouts == []
+    # the attempt only gets until the deadline
+    policy = RequestPolicy(timeout=5, retries=3, deadline=time.monotonic() + 0.05)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        policy.run(Call(seconds=1))
+    assert time.monotonic() - start < 0.5
+    # and isn't retried after it
+    with pytest.raises(RequestFailed):
+        RequestPolicy(retries=3, backoff=1, deadline=time.monotonic() + 0.2).run(Call(StatusError(500)))
+
+
+@pytest.mark.parametrize('max_concurrency', [1, 4])
+def test_falls_back_on_errors(mock_server, max_concurrency):
+    server = mock_server(error_rate=1.0)
+    writer = ChatGptWriter(max_concurrency=max_concurrency, retries=1)
+    writer.policy.backoff = 0
+    assert_runs(translate(writer))
+    assert server.mock.stats['errors'] > 0 and writer.policy.counts['retries'] > 0
+    # everything the play asked for was written by the RandomWriter
+    assert set(writer.fallbacks) >= {'title', 'character_description', 'act_description', 'scene_description'}
+
+
+def test_falls_back_at_deadline(mock_server):
+    mock_server(latency='2')
+    writer = ChatGptWriter(max_concurrency=4, deadline=0.2)
+    start = time.monotonic()
+    assert_runs(translate(writer))
+    assert time.monotonic() - start < 1.5
+    assert sum(writer.fallbacks.values()) > 0
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+import batch
+
+
+@pytest.fixture
+def programs(tmp_path):
+    for name, bf_code in (('a/hello.bf', '++++++++[>++++++<-]>.'), ('a/deep/hello.bf', '+++[>+++++<-]>.'),
+                          ('b/hello.bf', '-.'), ('bad.bf', '[')):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(bf_code)
+    return tmp_path
+
+
+def test_names(programs):
+    found = batch.find_named_programs([str(programs / 'a'), str(programs / 'b' / 'hello.bf')])
+    assert [name for _, name in found] == ['hello.bf', 'deep/hello.bf', 'hello.bf']
+    assert batch.output_path('deep/hello.bf', 'out') == os.path.join('out', 'deep', 'hello.spl')
+
+
+def test_same_output(programs):
+    found = batch.find_named_programs([str(programs / 'a'), str(programs / 'b')])
+    with pytest.raises(Exception, match='would both be written to'):
+        batch.check_outputs(found, 'out')
+    with pytest.raises(Exception, match='would both be written to'):
+        list(batch.translate_all(found, 'out', jobs=1))
+    batch.check_outputs(batch.find_named_programs([str(programs / 'a'), str(programs / 'bad.bf')]), 'out')
+
+
+def test_translate_all(programs, tmp_path, monkeypatch):
+    plays = {}
+    # the same plays, wherever it's run from
+    for cwd in (programs, programs / 'a' / 'deep'):
+        monkeypatch.chdir(cwd)
+        out_dir = tmp_path / f'out{len(plays)}'
+        found = batch.find_named_programs([os.path.relpath(programs / 'a'), os.path.relpath(programs / 'bad.bf')])
+        results = list(batch.translate_all(found, str(out_dir), opt_level=2, jobs=2))
+        assert [r['ok'] for r in results] == [True, True, False]
+        assert 'Unmatched' in results[2]['error']
+        plays[cwd] = {name: (out_dir / name).read_text() for name in ('hello.spl', 'deep/hello.spl')}
+    assert len(set(map(str, plays.values()))) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+import bf
+
+
+@pytest.mark.parametrize('program, stdin, expected', [
+    ('++++++++[>++++++<-]>.', b'', b'0'),
+    # cells wrap around
+    ('-.' + '+' * 257 + '.', b'', b'\xff\x00'),
+    # past the end of the input is 0
+    (',.,.,.', b'ab', b'ab\x00'),
+    ('>,[>,]<[.<]', b'abc', b'cba'),
+    ('[-]+[-.]', b'', b'\x00'),
+    # the tape grows to the right as needed
+    ('>' * 40000 + '+.', b'', b'\x01'),
+])
+def test_run(program, stdin, expected):
+    assert bf.run(program, stdin) == expected
+
+
+@pytest.mark.parametrize('program, message', [
+    ('[', "Unmatched '\\[' at index 0"),
+    ('+]', "Unmatched '\\]' at index 1"),
+    ('<+', 'Moved left of the first cell'),
+])
+def test_errors(program, message):
+    with pytest.raises(bf.BFError, match=message):
+        bf.run(program)
+
+
+def test_max_steps():
+    with pytest.raises(bf.BFError, match='Gave up after 100 steps'):
+        bf.run('+[]', max_steps=100)
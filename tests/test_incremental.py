@@ -0,0 +1,56 @@
+import pytest
+
+import bf
+import spl
+from bf2spl import Play
+from incremental import RegionCache
+from writers.default_writer import RandomWriter
+
+SETTINGS = {'writer': 'boring', 'opt_level': 0, 'lazy_stage': False}
+PROGRAM = '++++++[>++++++++<-]>.' + '[>+>+<<-]>>+.<<' + '+++[>+++<-]>[<+>-]<.'
+
+
+def translate(program: str, path, settings: dict = SETTINGS) -> tuple:
+    cache = RegionCache(str(path), settings)
+    play = Play(program, RandomWriter(), opt_level=settings['opt_level'], lazy_stage=settings['lazy_stage'],
+                region_cache=cache)
+    text = play.render_spl()
+    cache.save()
+    assert spl.run(text, strict=True) == bf.run(program)
+    return text, cache.stats(), len(play.regions())
+
+
+def test_unchanged(tmp_path):
+    path = tmp_path / 'regions.json'
+    first, stats, regions = translate(PROGRAM, path)
+    assert stats == {'reused': 0, 'rendered': regions}
+    second, stats, _ = translate(PROGRAM, path)
+    assert stats == {'reused': regions, 'rendered': 0}
+    assert second == first
+
+
+@pytest.mark.parametrize('lazy_stage', [False, True], ids=['eager', 'lazy'])
+@pytest.mark.parametrize('edit', [
+    ('[>+>+<<-]>>+.', '[>+>+<<-]>>++.'),  # inside one act
+    ('>.[', '>.+[-]+['),  # a new act, so the ones after it are renumbered
+    ('[>+>+<<-]>>+.<<', ''),  # an act fewer
+])
+def test_edit(tmp_path, edit, lazy_stage):
+    settings = dict(SETTINGS, lazy_stage=lazy_stage)
+    path = tmp_path / 'regions.json'
+    translate(PROGRAM, path, settings)
+    edited = PROGRAM.replace(*edit)
+    assert edited != PROGRAM
+    _, stats, regions = translate(edited, path, settings)
+    # only the regions around the edit are written again
+    assert stats['reused'] + stats['rendered'] == regions
+    assert 0 < stats['rendered'] <= 3
+    # and the old ones that weren't used are forgotten
+    assert len(RegionCache(str(path), settings).regions) == regions
+
+
+def test_settings_must_match(tmp_path):
+    path = tmp_path / 'regions.json'
+    translate(PROGRAM, path)
+    _, stats, regions = translate(PROGRAM, path, dict(SETTINGS, opt_level=2))
+    assert stats == {'reused': 0, 'rendered': regions}
@@ -0,0 +1,133 @@
+import pytest
+
+import bf
+from ir import Program, fold_runs, find_loop_idioms, track_offsets, partial_eval, drop_dead_loops, _run
+from ir import I_JMP_BGN, I_JMP_END, I_RIGHT, OP_ADD, OP_MUL, OP_MOVE, OP_ADD_AT, OP_SCAN, OP_PRINT, OP_TAPE
+
+# no input, and they never go left of the first cell
+PROGRAMS = [
+    '++++++++[>++++++<-]>.',
+    '+' * 300 + '.' + '-' * 600 + '.',
+    '>+>++<<+>>>+++<<<[>>>+<<<-]>>>.<<.>.<.',
+    '+++++[->++>+++<<]>[-]>.>+[<+>-]<.',
+    '++[>+++[>++<-]<-]>>.',
+    '>' + '+>' * 5 + '<' * 5 + '[>]<[<]>.' + '>+++[>]<.',
+    '>>>>' + '+<' * 3 + '>>>[<<]>.',
+    '-[>+<-----]>+.[-]<[>>+<<-]>>.',
+]
+
+
+def ops(program: Program) -> list:
+    return [(ins.op, ins.count) for ins in program]
+
+
+def output(program: Program) -> bytes:
+    index, _, _, out, _ = _run(program.instructions, 1_000_000)
+    assert index == len(program)
+    return bytes(out)
+
+
+def test_link():
+    program = Program.parse('+[>[-]<]')
+    assert [(ins.target, ins.depth) for ins in program] == [(-1, 0), (7, 0), (-1, 1), (5, 1), (-1, 2), (3, 1),
+                                                            (-1, 1), (1, 0)]
+
+
+@pytest.mark.parametrize('bf_code', ['[', ']', '[]]', '[[]'])
+def test_unmatched_brackets(bf_code):
+    with pytest.raises(Exception, match='Unmatched'):
+        Program.parse(bf_code)
+
+
+def test_number_acts():
+    program = Program.parse('+[>[-]<[.]]')
+    program.number_acts()
+    # outermost brackets start acts, the ones inside them scenes
+    assert [(ins.act, ins.scene) for ins in program if ins.op in (I_JMP_BGN, I_JMP_END)] == \
+        [(2, 1), (0, 2), (0, 3), (0, 4), (0, 5), (3, 1)]
+
+
+@pytest.mark.parametrize('bf_code', PROGRAMS)
+def test_passes_keep_output(bf_code):
+    expected = bf.run(bf_code)
+    program = Program.parse(bf_code)
+    assert output(program) == expected
+    for optimize in (fold_runs, find_loop_idioms, track_offsets, drop_dead_loops):
+        program = optimize(program)
+        assert output(program) == expected, optimize.__name__
+    # without input, all that's left is the output
+    assert [(ins.op, ins.data) for ins in partial_eval(program)] == [(OP_PRINT, expected)]
+
+
+def test_fold_runs():
+    assert ops(fold_runs(Program.parse('+++-->--+'))) == [(OP_ADD, 1), (I_RIGHT, 1), (OP_ADD, -1)]
+    # mod 256, whichever way is shorter
+    assert ops(fold_runs(Program.parse('+' * 300))) == [(OP_ADD, 44)]
+    assert ops(fold_runs(Program.parse('-' * 200))) == [(OP_ADD, 56)]
+    assert ops(fold_runs(Program.parse('+-+-.'))) == [('.', 1)]
+    assert [ins.source for ins in fold_runs(Program.parse('.++>-'))] == [0, 1, 3, 4]
+
+
+def test_find_loop_idioms():
+    program = find_loop_idioms(fold_runs(Program.parse('[-]>[->+>++<<]>[+>-<]')))
+    muls = [ins.data for ins in program if ins.op == OP_MUL]
+    # counting up, it runs 256 - value times, so taking 1 each time adds the value
+    assert muls == [{}, {1: 1, 2: 2}, {1: 1}]
+    assert I_JMP_BGN not in [ins.op for ins in program]
+
+
+@pytest.mark.parametrize('bf_code, loops', [('[-->+<]', 1), ('[-.]', 1), ('[->+]', 1), ('[[-]]', 1)])
+def test_find_loop_idioms_leaves_other_loops(bf_code, loops):
+    program = find_loop_idioms(fold_runs(Program.parse(bf_code)))
+    assert [ins.op for ins in program].count(I_JMP_BGN) == loops
+
+
+def test_track_offsets():
+    program = track_offsets(fold_runs(Program.parse('>+>++<<+>>>+++<<<')))
+    assert ops(program) == [(OP_ADD, 1), (OP_MOVE, 1), (OP_ADD, 1), (OP_MOVE, 1), (OP_ADD, 2), (OP_ADD_AT, 3),
+                            (OP_MOVE, -2)]
+    assert program[5].data == 1
+    # moves that cancel out leave nothing
+    assert ops(track_offsets(fold_runs(Program.parse('><<>')))) == []
+
+
+def test_track_offsets_scan_loops():
+    program = track_offsets(fold_runs(Program.parse('+[>>]+[<]+[>+<-]+[>.]')))
+    # a loop that does anything but move isn't a scan loop
+    assert [(ins.op, ins.count) for ins in program if ins.op in (OP_SCAN, OP_MOVE)] == [(OP_SCAN, 2), (OP_SCAN, -1),
+                                                                                        (OP_MOVE, 1)]
+    for ins in program:
+        if ins.op == OP_SCAN:
+            index = program.instructions.index(ins)
+            assert program[index - 1].op == I_JMP_BGN and program[index + 1].op == I_JMP_END
+
+
+def test_partial_eval():
+    assert [(ins.op, ins.data) for ins in partial_eval(fold_runs(Program.parse('++++++++[>++++++<-]>.')))] == \
+        [(OP_PRINT, b'0')]
+    # up to the first input, leaving the tape behind
+    program = partial_eval(fold_runs(Program.parse('+++>++.,.')))
+    assert [(ins.op, ins.count, ins.data) for ins in program] == [(OP_PRINT, 1, b'\x02'), (OP_TAPE, 1, (3, 2)),
+                                                                  (',', 1, None), ('.', 1, None)]
+    # nothing to do before the input
+    assert ops(partial_eval(fold_runs(Program.parse(',+.')))) == [(',', 1), (OP_ADD, 1), ('.', 1)]
+
+
+def test_partial_eval_gives_up():
+    # stopped part way through a loop, it goes back to the last top-level instruction
+    program = partial_eval(fold_runs(Program.parse('+[]')), 1000)
+    assert [ins.op for ins in program] == [OP_TAPE, I_JMP_BGN, I_JMP_END]
+    # left of the first cell
+    assert ops(partial_eval(Program.parse('<+'))) == [('<', 1), ('+', 1)]
+
+
+def test_drop_dead_loops():
+    program = drop_dead_loops(fold_runs(Program.parse('[-.]+[-][.]+.')))
+    assert ops(program) == [(OP_ADD, 1), (I_JMP_BGN, 1), (OP_ADD, -1), (I_JMP_END, 1), (OP_ADD, 1), ('.', 1)]
+    # the cell's value is known, so those can't wrap around
+    assert [ins.data for ins in program if ins.op == OP_ADD] == [True, None, True]
+
+
+def test_drop_dead_loops_after_input():
+    program = drop_dead_loops(fold_runs(Program.parse(',[-]+++')))
+    assert ops(program) == [(',', 1), (I_JMP_BGN, 1), (OP_ADD, -1), (I_JMP_END, 1), (OP_ADD, 3)]
@@ -0,0 +1,61 @@
+import pytest
+
+import spl
+
+PLAY = """A test.
+
+Romeo, a man.
+Juliet, a woman.
+
+Act I: Hello.
+Scene I: Start.
+
+[Enter Romeo and Juliet]
+Juliet: You are as good as the sum of a big big big big big big cat and a big cat. Speak your mind!
+Romeo: Open your mind. Am I as good as nothing?
+Juliet: If not, let us proceed to Scene II.
+Juliet: Speak your mind!
+
+Scene II: End.
+
+Juliet: Remember me. Recall your sins.
+Juliet: You are as bad as the difference between thyself and a cat. Speak your mind!
+[Exeunt]
+"""
+
+
+def test_run():
+    # 'B', then whatever was read, less one
+    assert spl.run(PLAY, b'x') == b'Bw'
+    assert spl.run(PLAY, b'\x01') == b'B\x00'
+    # -1 at the end of the input, and a byte can't be less than 0
+    with pytest.raises(spl.SPLError, match="can't speak the value -2"):
+        spl.run(PLAY, b'')
+
+
+@pytest.mark.parametrize('old, new, message', [
+    ('good as nothing', 'zorky as nothing', "'zorky' is not an adjective"),
+    ('big cat.', 'big zorkle.', "'zorkle' is not a noun"),
+])
+def test_strict(old, new, message):
+    play = PLAY.replace(old, new)
+    # unknown words are guessed at, unless it's strict
+    assert spl.run(play, b'x') == b'Bw'
+    with pytest.raises(spl.SPLError, match=message):
+        spl.run(play, b'x', strict=True)
+
+
+@pytest.mark.parametrize('old, new, message', [
+    ('Scene II.', 'Scene V.', 'no Scene 5 in Act 1'),
+    ('[Exeunt]', '[Exeunt]\n[Enter Romeo]\n[Enter Romeo]', 'Romeo is already on stage'),
+    ('Juliet: Remember me.', 'Juliet: Remember me. Recall it.\nJuliet:', "stack is empty"),
+])
+def test_errors(old, new, message):
+    with pytest.raises(spl.SPLError, match=message):
+        spl.run(PLAY.replace(old, new), b'x')
+
+
+def test_max_steps():
+    play = PLAY.replace('[Exeunt]', 'Scene III: Forever.\n\nJuliet: Let us return to Scene III.\n[Exeunt]')
+    with pytest.raises(spl.SPLError, match='gave up after 1000 statements'):
+        spl.run(play, b'x', max_steps=1000)
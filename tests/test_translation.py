@@ -0,0 +1,65 @@
+"""Every program in input/ and bench/programs, translated at every optimization level, says what its BF prints.
+Rendering a play in parallel gives the same play as rendering it in one process."""
+import os
+
+import pytest
+
+import bf
+import spl
+import difftest
+from bf2spl import Play, filter_bf
+from incremental import RegionCache
+from writers.writer import SPL_Writer
+from writers.default_writer import RandomWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STDIN = b'The quick brown fox jumps over the lazy dog.'
+# small programs for the corners the optimizations have to get right
+EXTRA = {
+    'wrap': '-.+.' + '+' * 300 + '.',
+    'clear_and_copy': '+++++[->++>+++<<]>[-]>.',
+    'nested': '++[>+++[>++<-]<-]>>.',
+    'scan': '>' + '+>' * 5 + '<' * 5 + '[>]<[<]>.' + '>+++[>]<.',
+    'scan_left': '>>>>' + '+<' * 3 + '>>>[<<]>.',
+    'offsets': '>+>++<<+>>>+++<<<[>>>+<<<-]>>>.<<.>.',
+    'echo': ',[.,]',
+    'reverse': '>,[>,]<[.<]',
+}
+
+
+def programs() -> list:
+    params = []
+    for path in difftest.find_programs([os.path.join(ROOT, 'input'), os.path.join(ROOT, 'bench', 'programs')]):
+        with open(path, 'r') as f:
+            params.append(pytest.param(f.read(), id=os.path.relpath(path, ROOT)))
+    params.extend(pytest.param(program, id=name) for name, program in EXTRA.items())
+    return params
+
+
+@pytest.mark.parametrize('lazy_stage', [False, True], ids=['eager', 'lazy'])
+@pytest.mark.parametrize('opt_level', [0, 1, 2, 3, 4])
+@pytest.mark.parametrize('program', programs())
+def test_translation(program, opt_level, lazy_stage):
+    result = difftest.check(program, STDIN, opt_level, max_steps=100_000, lazy_stage=lazy_stage)
+    if result.status == difftest.SKIPPED:
+        pytest.skip(result.message)
+    assert result.status == difftest.OK, str(result)
+
+
+@pytest.mark.parametrize('lazy_stage', [False, True], ids=['eager', 'lazy'])
+@pytest.mark.parametrize('opt_level', [0, 3])
+def test_parallel(opt_level, lazy_stage):
+    program = filter_bf(EXTRA['nested'] * 3 + EXTRA['scan'] + EXTRA['reverse'])
+    texts = [''.join(Play(program, RandomWriter(), opt_level=opt_level, lazy_stage=lazy_stage)
+                     .iter_spl_parallel(jobs, seed=1)) for jobs in (1, 3)]
+    # the same play however many jobs render it
+    assert texts[0] == texts[1]
+    assert spl.run(texts[0], STDIN, strict=True) == bf.run(program, STDIN)
+
+
+def test_parallel_needs_parallel_safe_writer(tmp_path):
+    with pytest.raises(Exception, match="can't write a play in parallel"):
+        ''.join(Play('+[.-]', SPL_Writer()).iter_spl_parallel(2))
+    cache = RegionCache(str(tmp_path / 'regions.json'), {})
+    with pytest.raises(Exception, match="can't be done in parallel"):
+        ''.join(Play('+[.-]', RandomWriter(), region_cache=cache).iter_spl_parallel(2))
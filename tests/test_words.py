@@ -0,0 +1,112 @@
+import os
+import marshal
+import shutil
+
+import pytest
+
+import words
+from writers.writer import SPL_Writer
+
+
+@pytest.fixture
+def word_lists(tmp_path, monkeypatch):
+    """A copy of wordlists/ with no cached index, that `words.load` reads instead."""
+    directory = tmp_path / 'wordlists'
+    shutil.copytree(words.WORDLIST_DIR, directory, ignore=shutil.ignore_patterns('index.marshal'))
+    monkeypatch.setattr(words, 'WORDLIST_DIR', str(directory))
+    monkeypatch.setattr(words, 'INDEX_FILE', str(directory / 'index.marshal'))
+    words.load.cache_clear()
+    yield directory
+    words.load.cache_clear()
+
+
+def reload() -> words.WordIndex:
+    words.load.cache_clear()
+    return words.load()
+
+
+@pytest.mark.parametrize('phrase, value', [
+    ('a cat', 1),
+    ('the big big cat', 4),
+    ('your cowardly coward', -2),
+    ('nothing', 0),
+    ('the sum of a cat and a big pig', -1),
+    ('the difference between a cat and twice a big cat', -3),
+    ('the product of a big cat and a coward', -2),
+    ('the quotient between a big big cat and a big cat', 2),
+    ('the remainder of the quotient between a big big cat and a big big pig', 0),
+    ('The Sum of a Cat and Nothing', 1),
+])
+def test_phrase_value(phrase, value):
+    assert words.load().phrase_value(phrase) == value
+
+
+@pytest.mark.parametrize('phrase, message', [
+    ('a', 'missing a noun'),
+    ('a dog', 'is not a noun'),
+    ('a cowardly cat', 'is not an adjective'),
+    ('a big nothing', 'can not have adjectives'),
+    ('the sum of a cat', "expected 'and'"),
+    ('the quotient between a cat and nothing', 'division by zero'),
+    ('twice', 'missing a value'),
+])
+def test_invalid_phrase(phrase, message):
+    index = words.load()
+    with pytest.raises(words.InvalidPhrase, match=message):
+        index.phrase_value(phrase)
+    assert not index.validate_phrase(phrase)
+
+
+def test_lookups():
+    index = words.load()
+    assert index.is_noun('Cat') and not index.is_noun('big')
+    assert index.is_adjective('big') and not index.is_adjective('cat')
+    assert [index.noun_sign(w) for w in ('cat', 'coward', 'nothing', 'big')] == [1, -1, 0, None]
+    assert index.adjective_fits('big', 1) and index.adjective_fits('big', -1)
+    assert index.adjective_fits('cowardly', -1) and not index.adjective_fits('cowardly', 1)
+
+
+def test_index_cache(word_lists):
+    index = words.load()
+    assert os.path.exists(words.INDEX_FILE)
+    assert words.load() is index
+    # the next process loads the cached lists instead of reading the word lists again
+    with open(words.INDEX_FILE, 'rb') as f:
+        lists = marshal.load(f)
+    lists['positive_noun'].append('dog')
+    with open(words.INDEX_FILE, 'wb') as f:
+        marshal.dump(lists, f)
+    assert reload().is_noun('dog')
+
+
+def test_index_cache_out_of_date(word_lists):
+    words.load()
+    cached = os.path.getmtime(words.INDEX_FILE)
+    with open(word_lists / 'positive_noun.wordlist', 'a') as f:
+        f.write('dog\n')
+    os.utime(word_lists / 'positive_noun.wordlist', (cached + 10, cached + 10))
+    assert reload().noun_sign('dog') == 1
+    with open(words.INDEX_FILE, 'rb') as f:
+        assert 'dog' in marshal.load(f)['positive_noun']
+
+
+def test_index_cache_corrupt(word_lists):
+    words.load()
+    with open(words.INDEX_FILE, 'wb') as f:
+        f.write(b'not marshal')
+    assert reload().is_noun('cat')
+
+
+class BadVocabulary(SPL_Writer):
+    positive_nouns = ('dog',)
+    validate_noun_phrases = True
+
+
+@pytest.mark.parametrize('num', [1, 7, -5, 0, 255])
+def test_noun_phrase_validation(num):
+    index = words.load()
+    # the default vocabulary doesn't need checking
+    assert not SPL_Writer.validate_noun_phrases
+    assert index.phrase_value(SPL_Writer().noun_phrase(num)) == num
+    # with a word SPL doesn't know, it falls back to the default
+    assert index.phrase_value(BadVocabulary().noun_phrase(num)) == num
@@ -30,4 +30,15 @@ def roman_numeral(num: int) -> str:
             i += 1
         if num == 0:
             break
-    return s
\ No newline at end of file
+    return s
+
+def from_roman_numeral(s: str) -> int:
+    values = dict(R_NUMERALS)
+    num = 0
+    for i, symbol in enumerate(s):
+        value = values[symbol]
+        if i + 1 < len(s) and values[s[i + 1]] > value:
+            num -= value
+        else:
+            num += value
+    return num
@@ -0,0 +1,173 @@
+"""
+SPL word lists (from wordlists/), indexed for fast validation and value computation.
+
+The lists are read once and the index is cached in a marshal file next to them,
+so later runs only have to load one small file.
+"""
+import os
+import marshal
+import functools
+
+WORDLIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wordlists')
+INDEX_FILE = os.path.join(WORDLIST_DIR, 'index.marshal')
+KINDS = (
+    'positive_noun', 'neutral_noun', 'negative_noun',
+    'positive_adjective', 'neutral_adjective', 'negative_adjective',
+    'positive_comparative', 'negative_comparative',
+    'nothing',
+)
+ARTICLES = frozenset(['a', 'an', 'the', 'my', 'mine', 'your', 'thy', 'thine', 'his', 'her', 'its', 'our', 'their'])
+BINARY_OPS = {
+    'sum': lambda a, b: a + b,
+    'difference': lambda a, b: a - b,
+    'product': lambda a, b: a * b,
+    'quotient': lambda a, b: int(a / b),
+    'remainder': lambda a, b: a - b * int(a / b),
+}
+
+
+class InvalidPhrase(Exception):
+    pass
+
+
+class WordIndex:
+    def __init__(self, lists: dict):
+        """`lists`: kind (see `KINDS`) -> words, all lowercase"""
+        for kind in KINDS:
+            setattr(self, kind + 's', frozenset(lists.get(kind, ())))
+        # noun -> sign, for positive/neutral (1), negative (-1) and nothing (0)
+        self.noun_signs = {}
+        for kind, sign in (('positive_noun', 1), ('neutral_noun', 1), ('negative_noun', -1), ('nothing', 0)):
+            for noun in lists.get(kind, ()):
+                self.noun_signs[noun] = sign
+        # adjective -> sign, neutral ones are 0
+        self.adjective_signs = {}
+        for kind, sign in (('positive_adjective', 1), ('neutral_adjective', 0), ('negative_adjective', -1)):
+            for adjective in lists.get(kind, ()):
+                self.adjective_signs[adjective] = sign
+
+    def is_adjective(self, word: str) -> bool:
+        return word.lower() in self.adjective_signs
+
+    def is_noun(self, word: str) -> bool:
+        return word.lower() in self.noun_signs
+
+    def noun_sign(self, noun: str):
+        """1 for positive/neutral nouns, -1 for negative ones, 0 for nothing, None if it isn't a noun."""
+        return self.noun_signs.get(noun.lower())
+
+    def adjective_fits(self, adjective: str, sign: int) -> bool:
+        """Whether `adjective` can describe a noun with the given sign."""
+        s = self.adjective_signs.get(adjective.lower())
+        return s is not None and (s == 0 or s == sign)
+
+    def noun_phrase_value(self, words: list) -> int:
+        """
+        Value of a single noun phrase: an optional article, adjectives and a noun,
+        where each adjective doubles the noun. `words` must be lowercase.
+        """
+        if words and words[0] in ARTICLES:
+            words = words[1:]
+        if not words:
+            raise InvalidPhrase('missing a noun')
+        # some nouns are two words
+        if len(words) >= 2 and ' '.join(words[-2:]) in self.noun_signs:
+            noun, adjectives = ' '.join(words[-2:]), words[:-2]
+        else:
+            noun, adjectives = words[-1], words[:-1]
+        sign = self.noun_signs.get(noun)
+        if sign is None:
+            raise InvalidPhrase(f'{noun!r} is not a noun')
+        if sign == 0:
+            if adjectives:
+                raise InvalidPhrase(f'{noun!r} can not have adjectives')
+            return 0
+        for adjective in adjectives:
+            if not self.adjective_fits(adjective, sign):
+                raise InvalidPhrase(f'{adjective!r} is not an adjective for {noun!r}')
+        return sign * 2 ** len(adjectives)
+
+    def phrase_value(self, phrase: str) -> int:
+        """
+        Value of a constant expression, such as
+        'the difference between a big big cat and the sum of a pig and nothing'.
+        Raises `InvalidPhrase` if it uses words SPL doesn't know.
+        """
+        tokens = phrase.lower().split()
+        value, pos = self._value(tokens, 0)
+        if pos != len(tokens):
+            raise InvalidPhrase(f"unexpected {' '.join(tokens[pos:])!r}")
+        return value
+
+    def validate_phrase(self, phrase: str) -> bool:
+        try:
+            self.phrase_value(phrase)
+            return True
+        except InvalidPhrase:
+            return False
+
+    def _value(self, tokens: list, pos: int) -> tuple:
+        def expect(*expected):
+            nonlocal pos
+            for w in expected:
+                if pos >= len(tokens) or tokens[pos] != w:
+                    raise InvalidPhrase(f'expected {w!r}')
+                pos += 1
+
+        if pos >= len(tokens):
+            raise InvalidPhrase('missing a value')
+        nxt = tokens[pos + 1] if pos + 1 < len(tokens) else None
+        if tokens[pos] == 'the' and nxt in BINARY_OPS:
+            pos += 2
+            if nxt == 'remainder':
+                expect('of', 'the', 'quotient', 'between')
+            elif nxt in ('difference', 'quotient'):
+                expect('between')
+            else:
+                expect('of')
+            a, pos = self._value(tokens, pos)
+            expect('and')
+            b, pos = self._value(tokens, pos)
+            if nxt in ('quotient', 'remainder') and b == 0:
+                raise InvalidPhrase('division by zero')
+            return BINARY_OPS[nxt](a, b), pos
+        if tokens[pos] == 'twice':
+            a, pos = self._value(tokens, pos + 1)
+            return 2 * a, pos
+        end = pos
+        while end < len(tokens) and tokens[end] != 'and':
+            end += 1
+        return self.noun_phrase_value(tokens[pos:end]), end
+
+
+def _read_lists() -> dict:
+    lists = {}
+    for kind in KINDS:
+        with open(os.path.join(WORDLIST_DIR, kind + '.wordlist'), 'r') as f:
+            lists[kind] = [line.strip().lower() for line in f if line.strip()]
+    return lists
+
+
+def _lists_mtime() -> float:
+    return max(os.path.getmtime(os.path.join(WORDLIST_DIR, kind + '.wordlist')) for kind in KINDS)
+
+
+@functools.lru_cache(maxsize=None)
+def load() -> WordIndex:
+    """The word index, from the marshal cache if it's up to date."""
+    lists = None
+    try:
+        if os.path.getmtime(INDEX_FILE) >= _lists_mtime():
+            with open(INDEX_FILE, 'rb') as f:
+                lists = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        lists = None
+    if lists is None:
+        lists = _read_lists()
+        try:
+            with open(INDEX_FILE, 'wb') as f:
+                marshal.dump(lists, f)
+        except OSError:
+            # read-only install, just don't cache
+            pass
+    return WordIndex(lists)
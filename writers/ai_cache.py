@@ -0,0 +1,87 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class CacheMiss(Exception):
+    """Raised in replay-only mode when a request isn't in the cache."""
+    pass
+
+
+class ResponseCache:
+    """
+    Persistent cache of chat completions, stored in SQLite.
+    Entries are keyed by a hash of the model, temperature and every message sent
+    (and a `variant`, for asking the same thing more than once),
+    and evicted least-recently-used first once there are more than `max_entries`,
+    or once they haven't been used for `max_age_days`.
+    With `replay_only`, a miss raises `CacheMiss` instead of going to the network.
+    """
+    def __init__(self, path: str = os.path.join('logs', 'ai-cache.sqlite'), max_entries: int = 100_000,
+                 max_age_days: float = 30, replay_only: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self.lock = threading.Lock()  # requests can come from several threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                        'key TEXT PRIMARY KEY, content TEXT, usage TEXT, created REAL, last_used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.evict()
+
+    @staticmethod
+    def key(model: str, temperature, messages: list, variant=None) -> str:
+        blob = json.dumps([model, temperature, messages] + ([variant] if variant is not None else []), sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Returns (content, usage dict) or None."""
+        with self.lock:
+            row = self.db.execute('SELECT content, usage FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay_only:
+                    raise CacheMiss(key)
+                return None
+            self.hits += 1
+            self.db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+            return row[0], json.loads(row[1])
+
+    def put(self, key: str, content: str, usage: dict = None):
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                            (key, content, json.dumps(usage), now, now))
+            self.db.commit()
+            self._puts += 1
+        # no need to check on every single write
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        with self.lock:
+            self.db.execute('DELETE FROM responses WHERE last_used < ?', (time.time() - self.max_age,))
+            count = self.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute('DELETE FROM responses WHERE key IN '
+                                '(SELECT key FROM responses ORDER BY last_used LIMIT ?)', (count - self.max_entries,))
+            self.db.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,78 @@
+import re
+from collections import deque
+
+# stage directions and blank lines say nothing about what the play is like
+STAGE_DIRECTION_RE = re.compile(r'^\s*(\[.*\])?\s*$')
+ACT_RE = re.compile(r'^Act [IVXLCDM]+:')
+SCENE_RE = re.compile(r'^Scene [IVXLCDM]+:')
+PERSONA_RE = re.compile(r'^[A-Z][\w\' -]*, .*[.!]$')
+# character descriptions are cut down to this many characters
+MAX_PERSONA_CHARS = 60
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly how many tokens `text` is, about 4 characters each for English."""
+    return (len(text) + 3) // 4
+
+
+class PromptContext:
+    """
+    What the AI is shown of the play so far, in at most `max_tokens` (estimated, see `estimate_tokens`).
+    Instead of the raw last lines, it's a summary kept up to date as the script is written (see `feed`):
+    the title, the characters, the last few act/scene descriptions, and then as many of the latest
+    lines of dialog as fit, without stage directions or lines that were already said.
+    """
+    def __init__(self, max_tokens: int = 300, max_lines: int = 100, max_headings: int = 4):
+        self.max_tokens = max_tokens
+        self.title = None
+        self.personae = []
+        self.headings = deque(maxlen=max_headings)  # latest 'Act ...:' and 'Scene ...:' lines
+        self.lines = deque(maxlen=max_lines)  # latest distinct lines of dialog
+        self.seen = set()  # everything in `lines`
+        self.partial = ''
+
+    def feed(self, text: str):
+        """Adds more of the script, as it's written."""
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self._add_line(line.strip())
+
+    def _add_line(self, line: str):
+        if STAGE_DIRECTION_RE.match(line):
+            return
+        if self.title is None:
+            self.title = line
+        elif ACT_RE.match(line) or SCENE_RE.match(line):
+            self.headings.append(line)
+        elif not self.headings and PERSONA_RE.match(line):
+            if len(line) > MAX_PERSONA_CHARS:
+                line = line[:MAX_PERSONA_CHARS - 3].rstrip() + '...'
+            self.personae.append(line)
+        elif line not in self.seen:
+            if len(self.lines) == self.lines.maxlen:
+                self.seen.discard(self.lines[0])
+            self.lines.append(line)
+            self.seen.add(line)
+
+    def render(self) -> str:
+        """The context to send, newest lines last."""
+        if self.title is None and not self.partial.strip():
+            return '[No content yet]'
+        summary = [f'Title: {self.title}']
+        if self.personae:
+            summary.append('Characters: ' + ' '.join(self.personae))
+        summary.extend(self.headings)
+        budget = self.max_tokens - sum(estimate_tokens(s) + 1 for s in summary) - estimate_tokens(self.partial)
+        recent = []
+        for line in reversed(self.lines):
+            budget -= estimate_tokens(line) + 1
+            if budget < 0:
+                break
+            recent.append(line)
+        if recent:
+            summary.append('Latest lines:')
+            summary.extend(reversed(recent))
+        if self.partial.strip():
+            summary.append(self.partial.strip())
+        return '\n'.join(summary)
@@ -1,16 +1,175 @@
 import os
-
-from openai import OpenAI
-
 import json
-import requests
+import random
 import datetime
+import time
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
 
 from util import roman_numeral
 from writers.writer import SPL_Writer
+from writers.ai_cache import ResponseCache, CacheMiss
+from writers.ai_context import PromptContext, estimate_tokens
+from writers.default_writer import RandomWriter
+import words
+
+KEY_FILE = 'openai-key.private'
+MODEL = 'gpt-3.5-turbo'
+# another server with the same API (like bench/mock_llm.py), None for OpenAI's; see `set_base_url`
+BASE_URL = os.environ.get('OPENAI_BASE_URL')
+
+_client = None  # see `get_client`
+_client_lock = threading.Lock()
+_request_pool = None  # see `RequestPolicy`
+# HTTP statuses worth trying again, besides server errors
+RETRY_STATUSES = (408, 409, 429)
+
+
+def get_client():
+    """
+    The OpenAI client, made the first time a request needs it:
+    importing openai and reading the key take a while, and aren't needed for cached responses.
+    A local server (see `BASE_URL`) doesn't need a key file.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+            try:
+                with open(KEY_FILE, 'r') as f:
+                    key = f.readline().strip()
+            except FileNotFoundError:
+                if BASE_URL is None:
+                    raise
+                key = 'local'
+            # retrying is up to `RequestPolicy`
+            _client = OpenAI(api_key=key, base_url=BASE_URL, max_retries=0)
+        return _client
+
+
+def set_base_url(url: str):
+    """Sends every request from now on to `url` instead (None for OpenAI)."""
+    global BASE_URL, _client
+    with _client_lock:
+        BASE_URL = url
+        _client = None
+
+
+class RequestFailed(Exception):
+    """A request failed every attempt (see `RequestPolicy`)."""
+    pass
+
+
+class DeadlineExceeded(RequestFailed):
+    """A request couldn't be made or finished before the play's deadline."""
+    pass
 
-OPENAI_KEY = open('openai-key.private', 'r').readline().strip()
-client = OpenAI(api_key=OPENAI_KEY)
+
+def _get_request_pool() -> ThreadPoolExecutor:
+    global _request_pool
+    with _client_lock:
+        if _request_pool is None:
+            _request_pool = ThreadPoolExecutor(32, thread_name_prefix='ai-request')
+        return _request_pool
+
+
+class RequestPolicy:
+    """
+    How long a request may take, and what happens when it's slow or fails.
+    Each attempt gets `timeout` seconds, and failed attempts are retried up to `retries` times,
+    waiting `backoff` seconds (with jitter, or as long as the server asks) and twice as long each time after.
+    With `hedge_after`, an attempt that hasn't finished after that many seconds gets a duplicate,
+    and whichever finishes first wins.
+    Nothing runs past `deadline` (a `time.monotonic()`), if there is one.
+    """
+    def __init__(self, timeout: float = None, retries: int = 0, backoff: float = 0.5, hedge_after: float = None,
+                 deadline: float = None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.counts = {'retries': 0, 'timeouts': 0, 'hedges': 0}
+
+    def _count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def remaining(self) -> float:
+        """Seconds until the deadline, or None if there isn't one."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def run(self, call):
+        """
+        Returns `call(timeout)`, where `timeout` is how long the attempt has (None for no limit).
+        Raises `RequestFailed` (from the last error) if every attempt fails.
+        """
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            timeout = self.timeout
+            remaining = self.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise DeadlineExceeded('The play ran out of time for requests')
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            try:
+                return self._attempt(call, timeout)
+            except Exception as e:
+                error = e
+                status = getattr(e, 'status_code', None)
+                if status is not None and status < 500 and status not in RETRY_STATUSES:
+                    break
+            if attempt == self.retries:
+                break
+            headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+            try:
+                wait_for = float(headers.get('retry-after'))
+            except (TypeError, ValueError):
+                wait_for = delay * (0.5 + random.random())
+            remaining = self.remaining()
+            if remaining is not None and wait_for >= remaining:
+                break
+            self._count('retries')
+            time.sleep(wait_for)
+            delay *= 2
+        if isinstance(error, FutureTimeout) and self.remaining() is not None and self.remaining() <= 0:
+            raise DeadlineExceeded('The play ran out of time for requests') from error
+        raise RequestFailed(f'{type(error).__name__}: {error}') from error
+
+    def _attempt(self, call, timeout: float):
+        if timeout is None and self.hedge_after is None:
+            return call(None)
+        # in another thread, so that a stuck request can be left behind
+        pool = _get_request_pool()
+        end = None if timeout is None else time.monotonic() + timeout
+        futures = [pool.submit(call, timeout)]
+        if self.hedge_after is not None and (timeout is None or self.hedge_after < timeout):
+            done, _ = wait(futures, self.hedge_after)
+            if not done:
+                self._count('hedges')
+                futures.append(pool.submit(call, None if end is None else end - time.monotonic()))
+        while True:
+            done, pending = wait(futures, None if end is None else max(0.0, end - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                self._count('timeouts')
+                raise FutureTimeout(f'No response in {timeout:.3g}s')
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+            if not pending:
+                raise next(iter(done)).exception()
+            futures = list(pending)
+
+
+# what the play is about, if the AI can't say
+DEFAULT_TOPIC = 'Anything you like'
 
 M_USER = lambda x: {'role':'user', 'content':x}
 M_SYS = lambda x: {'role':'system', 'content':x}
@@ -30,16 +189,22 @@ SPL_SYS_MSG =   "You are writing segments of 'code' for a programming " \
                 "It is ABSOLUTELY IMPERATIVE that all original content you generate is wrapped in the brackets {} as requested, like the following:\n" \
                 "Query: {}. # title of the play\nResponse: {The Tragedy of Romeo and Juliet}.\n\n" \
 
+# `SPL_SYS_MSG` in a fraction of the tokens, for when the context is budgeted (see `PromptContext`)
+SPL_SYS_MSG_SHORT = "You fill in the {} in lines of an SPL (Shakespeare Programming Language) play. " \
+                    "Reply with the line, every word you add wrapped in {}, e.g. 'You are as {filthy} as a coward!'. " \
+                    "Comments after # are hints.\n"
+
 SPL_PROMPT =    "Here is the last few lines of SPL which has been written so far:\n" \
                 "CONTEXT\n" \
                 "Here is the next line. Please fill in the {} appropriately in the following line:\n"
 
 class AIResponse:
-    def __init__(self, response: str, args: tuple[str], messages: list, api_response: dict):
+    def __init__(self, response: str, args: tuple[str], messages: list, api_response: dict, usage: dict = None):
         self.response = response
         self.args = args
         self.messages = messages
         self.api_response = api_response
+        self.usage = usage  # prompt and completion tokens, if the API said
 
 class AIResponseLogger:
     def __init__(self, filename: str, dir: str=''):
@@ -47,65 +212,101 @@ class AIResponseLogger:
         now = datetime.datetime.now()
         filename = now.strftime('%Y-%m-%d-%H-%M-%S') + '-' + filename
         self.filename = os.path.join(dir, filename)
+        self.lock = threading.Lock()  # requests can come from several threads
 
     def log(self, user_msg: str, ai_response: AIResponse):
-        with open(self.filename, 'a') as f:
+        with self.lock, open(self.filename, 'a') as f:
             f.write('-'*80 + '\n')
             f.write(f'User: {user_msg}\n')
             for msg in ai_response.messages[2:]:
                 f.write(f'{msg["role"]}: {msg["content"]}\n')
             f.write('\nParsed args: [' + ', '.join(ai_response.args) + ']\n')
+            if ai_response.usage:
+                f.write(f"Tokens: {ai_response.usage.get('prompt_tokens')} prompt, "
+                        f"{ai_response.usage.get('completion_tokens')} completion\n")
 
     def log_plain(self, user_msg: str, ai_response: str):
-        with open(self.filename, 'a') as f:
+        with self.lock, open(self.filename, 'a') as f:
             f.write('-'*80 + '\n')
             f.write(f'User: {user_msg}\nAI: {ai_response}\n\n')
 
-def ask_spl(query, context: str='[No content yet]', instructions=SPL_SYS_MSG, prompt=SPL_PROMPT, *args, **kwargs) -> AIResponse:
-    my_messages = [
-            M_SYS(instructions),
-            M_USER(prompt.replace('CONTEXT', context) + query),
-        ]
-    response = client.chat.completions.create(*args,
-    model='gpt-3.5-turbo',
-    messages=my_messages,
-    **kwargs)
+def complete(messages: list, cache: ResponseCache=None, profiler=None, policy: RequestPolicy=None,
+             cache_variant=None, **kwargs) -> tuple:
+    """
+    Returns the text of a chat completion, the API response it came from (None if it came from `cache`)
+    and its token usage (None if unknown).
+    Every request is recorded by `profiler`, if given (see profiler.py).
+    `policy` sets timeouts, retries and hedging; without one, a request is made once and may take forever.
+    `cache_variant` tells apart cached answers to the same messages (see `ResponseCache.key`).
+    A response missing from a replay-only cache, or a client that can't be made (see `get_client`),
+    is a `RequestFailed`, like a request that failed.
+    """
+    start = time.perf_counter()
+    key = None
+    if cache is not None:
+        key = cache.key(MODEL, kwargs.get('temperature'), messages, cache_variant)
+        try:
+            hit = cache.get(key)
+        except CacheMiss as e:
+            raise RequestFailed(f'Not in the response cache: {e}') from e
+        if hit is not None:
+            if profiler is not None:
+                profiler.request(start, True, hit[1])
+            return hit[0], None, hit[1]
+    try:
+        client = get_client()
+    except Exception as e:
+        # no openai package, no key, ...: this request can't be made, like one that failed
+        raise RequestFailed(f'No OpenAI client: {type(e).__name__}: {e}') from e
+    if policy is None:
+        response = client.chat.completions.create(model=MODEL, messages=messages, **kwargs)
+    else:
+        response = policy.run(lambda timeout: client.chat.completions.create(
+            model=MODEL, messages=messages, **({'timeout': timeout} if timeout is not None else {}), **kwargs))
     output = ''.join(response.choices[0].message.content)
-    output_og = output
+    usage = None
+    if getattr(response, 'usage', None) is not None:
+        usage = {
+            'prompt_tokens': response.usage.prompt_tokens,
+            'completion_tokens': response.usage.completion_tokens,
+        }
+    if profiler is not None:
+        profiler.request(start, False, usage)
+    if cache is not None:
+        cache.put(key, output, usage)
+    return output, response, usage
+
+def parse_args(output: str) -> tuple[str]:
+    """Everything wrapped in {}"""
     args = []
     while '{' and '}' in output:
         i = output.index('}')
         args.append(output[output.index('{')+1:i])
         output = output[i+1:]
+    return tuple(args)
 
-    return AIResponse(output_og, tuple(args), my_messages, response)
+def ask_spl(query, context: str='[No content yet]', instructions=SPL_SYS_MSG, prompt=SPL_PROMPT,
+            cache: ResponseCache=None, profiler=None, **kwargs) -> AIResponse:
+    my_messages = [
+            M_SYS(instructions),
+            M_USER(prompt.replace('CONTEXT', context) + query),
+        ]
+    output, response, usage = complete(my_messages, cache, profiler, **kwargs)
+    return AIResponse(output, parse_args(output), my_messages, response, usage)
 
-def clarify(previous_response: AIResponse, message: str, **kwargs) -> AIResponse:
+def clarify(previous_response: AIResponse, message: str, cache: ResponseCache=None, profiler=None,
+            **kwargs) -> AIResponse:
     all_messages = previous_response.messages + [M_USER(message)]
-    response = client.chat.completions.create(model='gpt-3.5-turbo',
-    messages=all_messages,
-    **kwargs)
-    output = ''.join(response.choices[0].message.content)
-    output_og = output
-    args = []
-    while '{' and '}' in output:
-        i = output.index('}')
-        args.append(output[output.index('{') + 1:i])
-        output = output[i + 1:]
+    output, response, usage = complete(all_messages, cache, profiler, **kwargs)
+    return AIResponse(output, parse_args(output), all_messages, response, usage)
 
-    return AIResponse(output_og, tuple(args), all_messages, response)
-
-def ask_raw(user_msg: str, **kwargs) -> str:
-    response = client.chat.completions.create(model='gpt-3.5-turbo',
-    messages=[
-        M_USER(user_msg)
-    ],
-    **kwargs)
-    return ''.join(response.choices[0].message.content)
+def ask_raw(user_msg: str, cache: ResponseCache=None, profiler=None, **kwargs) -> str:
+    return complete([M_USER(user_msg)], cache, profiler, **kwargs)[0]
 
 
 def cache(section: str):
     def f_gen(func):
+        @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
             if section not in self.cache:
                 self.cache[section] = {}
@@ -115,12 +316,29 @@ def cache(section: str):
         return wrapper
     return f_gen
 
+def fallback(f):
+    """
+    If a request for `f` fails, runs out of time or can't be made at all (see `complete`),
+    the slot is filled in by the writer's `fallback` instead,
+    so that the play always gets written.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return f(self, *args, **kwargs)
+        except RequestFailed:
+            with self.stats_lock:
+                self.fallbacks[f.__name__] = self.fallbacks.get(f.__name__, 0) + 1
+            return getattr(self.fallback, f.__name__)(*args, **kwargs)
+    return wrapper
+
 def end_punc(f):
     """
     Ensure a function produces output that ends with punctuation.
     :param f:
     :return:
     """
+    @functools.wraps(f)
     def wrapper(self, *args, **kwargs):
         response = f(self, *args, **kwargs)
         if response[-1] not in ['.', '!']:
@@ -128,28 +346,208 @@ def end_punc(f):
         return response
     return wrapper
 
+class VocabularyPool:
+    """
+    Words (or phrases) of one kind, requested in bulk and handed out one at a time.
+    When the pool runs low, more are requested in the background, up to `max_fetches` times;
+    after that, words that were already handed out are shuffled and reused.
+    """
+    def __init__(self, fetch, size: int, submit=None, max_fetches: int = 2):
+        self.fetch = fetch  # (number of fetches before this one) -> list of valid words
+        self.size = size
+        self.submit = submit  # runs `fetch` in the background, returning a future
+        self.max_fetches = max_fetches
+        self.fetches = 0
+        self.words = deque()
+        self.used = []
+        self.pending = None
+
+    def _refill(self):
+        number = self.fetches
+        self.fetches += 1
+        if self.submit is None:
+            self._add(lambda: self.fetch(number))
+        else:
+            self.pending = self.submit(self.fetch, number)
+
+    def _collect(self):
+        pending, self.pending = self.pending, None
+        self._add(pending.result)
+
+    def _add(self, get_words):
+        try:
+            self.words.extend(get_words())
+        except RequestFailed:
+            pass  # that fetch is used up, the words already handed out will do
+
+    def take(self):
+        """A word, or None if there aren't any valid ones to be had."""
+        if self.pending is not None and (self.pending.done() or not self.words):
+            self._collect()
+        if len(self.words) <= self.size // 4 and self.pending is None and self.fetches < self.max_fetches:
+            self._refill()
+            if not self.words and self.pending is not None:
+                self._collect()
+        if not self.words:
+            random.shuffle(self.used)
+            self.words.extend(self.used)
+            self.used = []
+        if not self.words:
+            return None
+        word = self.words.popleft()
+        self.used.append(word)
+        return word
+
 class ChatGptWriter(SPL_Writer):
-    def __init__(self, context_window_lines: int = 10, temp=0.3, logger:AIResponseLogger=None):
+    """
+    With `max_concurrency` > 1, requests are made from a thread pool:
+    act and scene descriptions are all requested up front (see `prepare`),
+    and adjectives and recall fluff are requested a few ahead of when they're needed.
+    Responses are looked up in (and saved to) `response_cache` if there is one.
+    With `pool_size` > 0, adjectives, recall fluff and the nouns/adjectives used in noun phrases
+    are requested `pool_size` at a time (see `VocabularyPool`) instead of once per statement.
+    `profiler` instruments the writer from the start, so that it sees every request (see `SPL_Writer.instrument`).
+    Requests time out after `timeout` seconds and are retried `retries` times, with a duplicate after `hedge_after`
+    seconds (see `RequestPolicy`), and no request runs more than `deadline` seconds after the play starts.
+    Whatever can't be answered in time is written by a `RandomWriter` instead.
+    With `context_tokens` > 0, prompts show a summary of the play of about that many tokens (see `PromptContext`)
+    instead of the last `context_window_lines` lines, with shorter instructions.
+    """
+    # the noun phrase vocabulary comes from the model (see `_load_vocabulary`)
+    validate_noun_phrases = True
+
+    def __init__(self, context_window_lines: int = 10, temp=0.3, logger:AIResponseLogger=None,
+                 max_concurrency: int = 1, response_cache: ResponseCache=None, pool_size: int = 0, profiler=None,
+                 timeout: float = 30.0, retries: int = 2, hedge_after: float = None, deadline: float = None,
+                 context_tokens: int = 0):
         super().__init__(context_window_lines)
+        if profiler is not None:
+            self.instrument(profiler)
+        self.policy = RequestPolicy(timeout, retries, hedge_after=hedge_after)
+        self.deadline = deadline
+        self.fallback = RandomWriter()
+        self.fallbacks = {}  # writer method -> number of times `fallback` stood in for it
+        self.stats_lock = threading.Lock()
+        self.prompt_context = PromptContext(context_tokens) if context_tokens > 0 else None
+        self.instructions = SPL_SYS_MSG if self.prompt_context is None else SPL_SYS_MSG_SHORT
+        self.tokens = {'calls': 0, 'context': 0, 'prompt': 0, 'completion': 0}  # see `_count_tokens`
         self.logger = logger
+        self.response_cache = response_cache
         self.temp = temp
-        self.topic = self.ask_raw('What should the topic of this play be? Be short and descriptive. For example, '
-                             '"A whimsical comedy set in a quaint bakery where the arrival of a mysterious batch '
-                             'of enchanted muffins causes chaos and hilarity among the townsfolk"')
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_concurrency) if max_concurrency > 1 else None
+        self.prefetched = {}  # ('act', act #) or ('scene', act #, scene #) -> future description
+        self.read_ahead = {}  # query -> deque of future answers
+        self.read_ahead_counts = {}  # query -> number of times it's been asked ahead
+        self.pool_size = pool_size
+        self.vocabulary_pools = {}  # 'adjective' or 'recall' -> VocabularyPool
+        self.words = words.load()
+        self.background = None  # see `_submit`
+        self._topic = None  # see `topic`
+        self._topic_lock = threading.Lock()
         self.cache = {}
         self.characters = {}
+        self._new_vocabulary_pools()
+
+    def _new_vocabulary_pools(self):
+        if self.pool_size <= 0:
+            return
+        self.vocabulary_pools = {
+            'adjective': VocabularyPool(lambda n: self._fetch_words('adjectives', self.words.is_adjective, n),
+                                        self.pool_size, self._submit),
+            'recall': VocabularyPool(lambda n: self._fetch_words('short phrases that could follow "Recall" '
+                                                                 'in a line of dialog', self._valid_fluff, n),
+                                     self.pool_size, self._submit),
+        }
+
+    @property
+    def topic(self) -> str:
+        """Asked for the first time it's needed, rather than holding up the constructor."""
+        with self._topic_lock:
+            if self._topic is None:
+                try:
+                    self._topic = self._ask_topic()
+                except RequestFailed:
+                    self._topic = DEFAULT_TOPIC
+            return self._topic
+
+    def _ask_topic(self) -> str:
+        return self.ask_raw('What should the topic of this play be? Be short and descriptive. '
+                                           'For example, "A whimsical comedy set in a quaint bakery where the '
+                                           'arrival of a mysterious batch of enchanted muffins causes chaos and '
+                                           'hilarity among the townsfolk"')
+
+    def request_stats(self) -> dict:
+        """
+        Retries, timeouts and hedged requests so far, the slots that had to be filled in without the AI,
+        and tokens: estimated for the context, and as counted by the API for the whole prompt and completion.
+        """
+        with self.stats_lock:
+            fallbacks = dict(self.fallbacks)
+            tokens = dict(self.tokens)
+        with self.policy.lock:
+            return dict(self.policy.counts, fallbacks=fallbacks, tokens=tokens)
+
+    def _count_tokens(self, context: str, usage: dict):
+        with self.stats_lock:
+            self.tokens['calls'] += 1
+            self.tokens['context'] += estimate_tokens(context)
+            if usage:
+                self.tokens['prompt'] += usage.get('prompt_tokens') or 0
+                self.tokens['completion'] += usage.get('completion_tokens') or 0
+
+    def _buf_append(self, newstuff: str):
+        super()._buf_append(newstuff)
+        if self.prompt_context is not None:
+            self.prompt_context.feed(newstuff)
+
+    def _clear_buffer(self):
+        super()._clear_buffer()
+        if self.prompt_context is not None:
+            self.prompt_context = PromptContext(self.prompt_context.max_tokens)
+
+    def _context(self) -> str:
+        """What prompts show of the script so far."""
+        if self.prompt_context is not None:
+            return self.prompt_context.render()
+        return self.script_buffer
+
+    def _submit(self, fn, *args):
+        """Runs `fn(*args)` in the pool, or without one, in a background thread that lasts until `finish`."""
+        if self.pool is not None:
+            return self.pool.submit(fn, *args)
+        if self.background is None:
+            self.background = ThreadPoolExecutor(1, thread_name_prefix='ai-background')
+        return self.background.submit(fn, *args)
+
+    def _result(self, future):
+        """`future.result()`, but giving up at the play's deadline."""
+        try:
+            return future.result(self.policy.remaining())
+        except FutureTimeout:
+            raise DeadlineExceeded('The play ran out of time for requests')
 
     def ask_raw(self, query: str, **kwargs) -> str:
-        response = ask_raw(query, temperature=self.temp, **kwargs)
+        response, _, usage = complete([M_USER(query)], cache=self.response_cache, profiler=self.profiler,
+                                      policy=self.policy, temperature=self.temp, **kwargs)
+        self._count_tokens('', usage)
         if self.logger is not None:
             self.logger.log_plain(query, response)
         return response
 
-    def ask_with_response(self, query: str, expected_args: int=0, **kwargs) -> AIResponse:
-        response = ask_spl(query, self.script_buffer + '\n\nThe topic of this play is: ' + self.topic,
+    def ask_with_response(self, query: str, expected_args: int=0, context: str=None, **kwargs) -> AIResponse:
+        """`context` defaults to the script so far."""
+        if context is None:
+            context = self._context()
+        response = ask_spl(query, context + '\n\nThe topic of this play is: ' + self.topic, self.instructions,
+                       cache=self.response_cache, profiler=self.profiler, policy=self.policy,
                        temperature=self.temp, **kwargs)
+        self._count_tokens(context, response.usage)
         if len(response.args) < expected_args:
-            response = clarify(response, 'Please ensure to use {} around all responses. There are %d required.'%expected_args)
+            response = clarify(response, 'Please ensure to use {} around all responses. There are %d required.'%expected_args,
+                               cache=self.response_cache, profiler=self.profiler, policy=self.policy,
+                               cache_variant=kwargs.get('cache_variant'))
+            self._count_tokens('', response.usage)
         if self.logger is not None:
             self.logger.log(query, response)
         return response
@@ -157,7 +555,89 @@ class ChatGptWriter(SPL_Writer):
     def ask(self, query: str, expected_args: int=0, **kwargs) -> tuple[str]:
         return self.ask_with_response(query, expected_args, **kwargs).args
 
+    def _fetch_words(self, description: str, valid, number: int = None) -> list:
+        """Asks for `pool_size` words at once, keeping the valid ones. `number` tells apart repeated requests."""
+        inputs = ', '.join(['{}'] * self.pool_size)
+        answers = self.ask(f'{self.pool_size} {description} that suit the topic of this play: ' + inputs,
+                           expected_args=self.pool_size, context='[No content yet]', cache_variant=number)
+        return list(dict.fromkeys(w.strip() for w in answers if valid(w.strip())))
+
+    def _valid_fluff(self, fluff: str) -> bool:
+        return 0 < len(fluff) < 80 and not any(c in fluff for c in '{}[]:\n')
+
+    def _load_vocabulary(self):
+        """Noun phrase vocabulary for the whole play, in one request per kind of word."""
+        kinds = {
+            'positive_nouns': ('pleasant or neutral nouns', lambda w: self.words.noun_sign(w) == 1),
+            'negative_nouns': ('insulting nouns', lambda w: self.words.noun_sign(w) == -1),
+            'positive_adjectives': ('pleasant or neutral adjectives', lambda w: self.words.adjective_fits(w, 1)),
+            'negative_adjectives': ('insulting or neutral adjectives', lambda w: self.words.adjective_fits(w, -1)),
+        }
+        futures = {attr: self._submit(self._fetch_words, description, valid)
+                   for attr, (description, valid) in kinds.items()}
+        for attr, future in futures.items():
+            try:
+                words = self._result(future)
+            except RequestFailed:
+                words = None
+            # not the last play's words, if nothing usable came back for this one
+            setattr(self, attr, tuple(words or getattr(self.fallback, attr)))
+
+    def choose_word(self, words: tuple) -> str:
+        return random.choice(words)
+
+    def prepare(self, acts: dict):
+        """
+        Starts on a new play: everything the last one asked for (topic, title, characters, vocabulary)
+        is forgotten, but the client, word lists and response cache stay warm.
+        """
+        self.policy.deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        with self._topic_lock:
+            self._topic = None
+        self.cache = {}
+        self.characters = {}
+        self._new_vocabulary_pools()
+        if self.pool_size > 0:
+            self._load_vocabulary()
+        if self.pool is None:
+            return
+        # these run before (or alongside) the rest of the script, so they can't see it
+        context = '[No content yet]'
+        for act, scenes in acts.items():
+            self.prefetched['act', act] = self.pool.submit(self._act_description, act, context)
+            for scene in scenes:
+                # every act has a scene I, so tell their requests apart
+                self.prefetched['scene', act, scene] = self.pool.submit(self._scene_description, scene, context, act)
+
+    def finish(self):
+        for futures in self.read_ahead.values():
+            for future in futures:
+                future.cancel()
+        self.read_ahead = {}
+        self.read_ahead_counts = {}
+        self.prefetched = {}
+        if self.background is not None:
+            self.background.shutdown(wait=False, cancel_futures=True)
+            self.background = None
+
+    def _ahead(self, query: str) -> str:
+        """
+        Answers `query`, keeping `max_concurrency` requests for it in flight.
+        How far the script has got when one is made depends on timing, so they don't see it,
+        and are numbered instead, so that each is cached (and replayed) as the same request every time.
+        """
+        if self.pool is None:
+            return self.ask(query)[0]
+        futures = self.read_ahead.setdefault(query, deque())
+        while len(futures) < self.max_concurrency:
+            number = self.read_ahead_counts.get(query, 0)
+            self.read_ahead_counts[query] = number + 1
+            futures.append(self.pool.submit(lambda n: self.ask(query, context='[No content yet]',
+                                                               cache_variant=n)[0], number))
+        return self._result(futures.popleft())
+
     @cache('title')
+    @fallback
     @end_punc
     def title(self) -> str:
         return self.ask('{}. # title of the play')[0]
@@ -167,40 +647,63 @@ class ChatGptWriter(SPL_Writer):
         if len(self.characters) == 0:
             num_characters = 5
             inputs = ', '.join(["{}" for _ in range(num_characters)])
-            characters = self.ask('Names of Shakespearean characters to use in this play: ' + inputs)
+            try:
+                characters = self.ask('Names of Shakespearean characters to use in this play: ' + inputs)
+            except RequestFailed:
+                # all or nothing, so that no two characters get the same name
+                characters = self.fallback.spl_names
             self.characters = {i: characters[i] for i in range(num_characters)}
         return self.characters[character_id]
 
     @cache('character_description')
+    @fallback
     @end_punc
     def character_description(self, c_id: int) -> str:
         return self.ask(self.character_name(c_id) + ', {}. # fruitful description of this character')[0]
 
+    @fallback
     @end_punc
     def act_description(self) -> str:
-        return self.ask('Act ' + roman_numeral(self.current_act) + ': {}. # act description')[0]
+        future = self.prefetched.pop(('act', self.current_act), None)
+        if future is not None:
+            return self._result(future)
+        return self._act_description(self.current_act)
 
+    def _act_description(self, act: int, context: str=None) -> str:
+        return self.ask('Act ' + roman_numeral(act) + ': {}. # act description', context=context)[0]
+
+    @fallback
     @end_punc
     def scene_description(self) -> str:
-        return self.ask('Scene ' + roman_numeral(self.current_scene) + ': {}. # scene description')[0]
-
-    def noun_phrase(self, num: int) -> str:
-        if num == 1:
-            return "a cat"
-        elif num == -1:
-            return 'a ' + 'coward'
-        elif num == 255:
-            # noun phrase evaluating to 255. example:
-            # rich beautiful blue clearest sweetest huge green peaceful sky
-            return "the difference between the rich beautiful blue clearest sweetest huge green peaceful sky and my nose"
-        else:
-            raise Exception("Default writer can't create a noun phrase for the value " + num)
+        future = self.prefetched.pop(('scene', self.current_act, self.current_scene), None)
+        if future is not None:
+            return self._result(future)
+        return self._scene_description(self.current_scene)
+
+    def _scene_description(self, scene: int, context: str=None, cache_variant=None) -> str:
+        return self.ask('Scene ' + roman_numeral(scene) + ': {}. # scene description', context=context,
+                        cache_variant=cache_variant)[0]
 
+    @fallback
     @end_punc
     def recall_fluff(self) -> str:
-        fluff = self.ask('Recall {} # anything appropriate!')[0]
+        fluff = None
+        if 'recall' in self.vocabulary_pools:
+            fluff = self.vocabulary_pools['recall'].take()
+        if fluff is None:
+            fluff = self._ahead('Recall {} # anything appropriate!')
         return f'Recall {fluff}'
 
+    @fallback
     def simile_adj(self, inflection_hint: int = 0) -> str:
-        return self.ask('I am as {} as ...')[0]
+        adjective = None
+        if 'adjective' in self.vocabulary_pools:
+            adjective = self.vocabulary_pools['adjective'].take()
+        if adjective is None:
+            adjective = self._ahead('I am as {} as ...').strip()
+        if not self.words.is_adjective(adjective):
+            # not worth another round trip
+            adjectives = self.words.positive_adjectives if inflection_hint > 0 else self.words.negative_adjectives
+            adjective = random.choice(sorted(adjectives))
+        return adjective
 
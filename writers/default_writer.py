@@ -20,6 +20,14 @@ def _r(*args):
     return coll[i]
 
 class RandomWriter(SPL_Writer):
+    uses_context = False
+    parallel_safe = True
+
+    positive_nouns = ('cat', 'sky', 'flower')
+    negative_nouns = ('flirt-gill', 'coward')
+    positive_adjectives = ('rich', 'beautiful', 'blue', 'clearest', 'sweetest', 'huge', 'green', 'peaceful')
+    negative_adjectives = ('big', 'fat', 'smelly')
+
     def __init__(self, context_window_lines: int = 100):
         super().__init__(context_window_lines)
         self.spl_names = [
@@ -46,17 +54,8 @@ class RandomWriter(SPL_Writer):
     def scene_description(self) -> str:
         return "scene description."
 
-    def noun_phrase(self, num: int) -> str:
-        if num == 1:
-            return "a cat"
-        elif num == -1:
-            return 'a ' + _r('flirt-gill', 'coward')
-        elif num == 255:
-            # noun phrase evaluating to 255. example:
-            # rich beautiful blue clearest sweetest huge green peaceful sky
-            return "the difference between the rich beautiful blue clearest sweetest huge green peaceful sky and my nose"
-        else:
-            raise Exception("Default writer can't create a noun phrase for the value " + num)
+    def choose_word(self, words: tuple) -> str:
+        return _r(words)
 
     def recall_fluff(self) -> str:
         return _r("your actions from the last moment.",
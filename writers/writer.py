@@ -1,18 +1,133 @@
+import functools
+from collections import deque
+
+import words
+
+
+# noun phrase expression trees (see `noun_phrase_tree`)
+NP_NOTHING = 'nothing'  # ('nothing',)
+NP_TERM = 'term'  # ('term', sign, power): an article, `power` adjectives and a noun
+NP_SUM = 'sum'  # ('sum', a, b)
+NP_DIFF = 'difference'  # ('difference', a, b)
+
+
+def _np_words(tree) -> int:
+    """Number of words `tree` takes to write out."""
+    kind = tree[0]
+    if kind == NP_NOTHING:
+        return 1
+    if kind == NP_TERM:
+        return tree[2] + 2
+    # 'the sum of a and b' / 'the difference between a and b'
+    return 4 + _np_words(tree[1]) + _np_words(tree[2])
+
+
+def _np_negate(tree):
+    kind = tree[0]
+    if kind == NP_NOTHING:
+        return tree
+    if kind == NP_TERM:
+        return NP_TERM, -tree[1], tree[2]
+    return kind, _np_negate(tree[1]), _np_negate(tree[2])
+
+
+@functools.lru_cache(maxsize=4096)
+def noun_phrase_tree(num: int):
+    """
+    Shortest (in words) expression worth `num`, built from powers of two
+    (each adjective doubles the value of a noun) and sums/differences of them.
+    Example: 255 -> ('difference', ('term', 1, 8), ('term', 1, 0)),
+    i.e. 'the difference between a big big big big big big big big cat and a cat'
+    """
+    if num == 0:
+        return NP_NOTHING,
+    if num < 0:
+        return _np_negate(noun_phrase_tree(-num))
+    power = num.bit_length() - 1
+    if num == 1 << power:
+        return NP_TERM, 1, power
+    # either build up from the power of two below, or down from the one above
+    below = NP_SUM, (NP_TERM, 1, power), noun_phrase_tree(num - (1 << power))
+    above = NP_DIFF, (NP_TERM, 1, power + 1), noun_phrase_tree((1 << (power + 1)) - num)
+    return min(below, above, key=_np_words)
+
+
+def noun_phrase_words(num: int) -> int:
+    """Number of words the noun phrase for `num` takes."""
+    return _np_words(noun_phrase_tree(num))
+
+
 class SPL_Writer:
+    # writers that never read `script_buffer` should set this to False,
+    # so that the context window isn't maintained at all
+    uses_context = True
+    # writers whose output for a statement doesn't depend on the ones before it (other than through `random`),
+    # and that can be made without arguments, can have a play rendered in parallel (see `Play.iter_spl_parallel`)
+    parallel_safe = False
+
+    # vocabulary used by `noun_phrase`; writers can override just these to change its wording.
+    # all adjectives double the value of the noun, positive ones go with positive nouns, etc.
+    # neutral words can go in either list
+    positive_nouns = ('cat',)
+    negative_nouns = ('coward',)
+    positive_adjectives = ('big',)
+    negative_adjectives = ('big',)
+    # check every noun phrase against the SPL word lists, for writers whose vocabulary might have bad words in it
+    validate_noun_phrases = False
+    noun_phrase_tries = 3
+
+    # what `instrument` times, everything Play asks the writer for
+    instrumented_methods = ('prepare', 'finish', 'title', 'character_name', 'character_description',
+                            'act_description', 'scene_description', 'noun_phrase', 'recall_fluff', 'simile_adj')
+    profiler = None  # see `instrument`
+
     def __init__(self, context_window_lines: int = 100):
         self.context_window_lines = context_window_lines
-        self.script_buffer = ''  # in progress script, optionally used for context
+        # in progress script, optionally used for context (see `script_buffer`)
+        self._context_lines = deque(maxlen=context_window_lines)  # last complete lines, each ending in '\n'
+        self._context_partial = ''  # unfinished last line
         self.current_act = None  # updated by Play
         self.current_scene = None  # updated by Play
         pass
 
+    @property
+    def script_buffer(self) -> str:
+        """The last `context_window_lines` lines of the script written so far."""
+        return ''.join(self._context_lines) + self._context_partial
+
     def _buf_append(self, newstuff: str):
-        self.script_buffer += newstuff
-        if newstuff.endswith('\n') and self.script_buffer.count('\n') > self.context_window_lines:
-            self.script_buffer = self.script_buffer[self.script_buffer.find('\n') + 1:]
+        if not self.uses_context:
+            return
+        lines = (self._context_partial + newstuff).split('\n')
+        self._context_partial = lines.pop()
+        if len(lines) > self.context_window_lines:
+            lines = lines[len(lines) - self.context_window_lines:]
+        self._context_lines.extend(line + '\n' for line in lines)
 
     def _clear_buffer(self):
-        self.script_buffer = ''
+        self._context_lines.clear()
+        self._context_partial = ''
+
+    def instrument(self, profiler):
+        """
+        Times every call to `instrumented_methods` with a `profiler.Profiler`.
+        Writers that make requests of their own can record them with `self.profiler`.
+        """
+        self.profiler = profiler
+        for name in self.instrumented_methods:
+            setattr(self, name, profiler.wrap(name, getattr(self, name)))
+
+    def prepare(self, acts: dict):
+        """
+        Called by Play before anything is written, with each act # mapped to the list of its scene #s.
+        Writers can use it to start on descriptions early,
+        and writers that remember anything about a play must forget the last one here (they can be reused). Optional.
+        """
+        pass
+
+    def finish(self):
+        """Called by Play once the play has been written. Optional."""
+        pass
 
     def title(self) -> str:
         """Must end with a period"""
@@ -38,9 +153,44 @@ class SPL_Writer:
         """
         Begins with an article, if necessary?
         Expression that evaluates to `num`. Does not need to end with a period.
-        Minimally, only needs to support 255, -1, and 1
+        Minimally, only needs to support 255, -1, and 1.
+        With optimizations enabled (see `Play`), it must support any value.
+        The default builds the shortest expression out of the writer's vocabulary.
         """
-        pass
+        tree = noun_phrase_tree(num)
+        if not self.validate_noun_phrases:
+            return self._render_noun_phrase(tree, self)
+        index = words.load()
+        for _ in range(self.noun_phrase_tries):
+            phrase = self._render_noun_phrase(tree, self)
+            try:
+                if index.phrase_value(phrase) == num:
+                    return phrase
+            except words.InvalidPhrase:
+                pass
+        # the vocabulary must be bad, fall back to the one that's known to work
+        return self._render_noun_phrase(tree, SPL_Writer)
+
+    def _render_noun_phrase(self, tree, vocabulary) -> str:
+        """`vocabulary` is anything with the `positive_nouns`... attributes, usually `self`."""
+        kind = tree[0]
+        if kind == NP_NOTHING:
+            return 'nothing'
+        if kind == NP_TERM:
+            _, sign, power = tree
+            adjectives = vocabulary.positive_adjectives if sign > 0 else vocabulary.negative_adjectives
+            nouns = vocabulary.positive_nouns if sign > 0 else vocabulary.negative_nouns
+            phrase = ['a'] + [self.choose_word(adjectives) for _ in range(power)] + [self.choose_word(nouns)]
+            return ' '.join(phrase)
+        a = self._render_noun_phrase(tree[1], vocabulary)
+        b = self._render_noun_phrase(tree[2], vocabulary)
+        if kind == NP_SUM:
+            return f'the sum of {a} and {b}'
+        return f'the difference between {a} and {b}'
+
+    def choose_word(self, words: tuple) -> str:
+        """Picks one word from a vocabulary list."""
+        return words[0]
 
     def recall_fluff(self) -> str:
         """Fluff following 'Recall' in a recall statement. MUST end with punctuation."""